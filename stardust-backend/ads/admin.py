@@ -1,5 +1,7 @@
-from django.contrib import admin
-from .models import Category, SubCategory, Country, Province, City, Ad, AdMedia
+from django.contrib import admin, messages
+from .models import Category, SubCategory, Country, Province, City, ExchangeRate, Ad, AdMedia
+from .services import AdLifecycleService
+from .registry import location_label, lookup, name_of
 
 # Inline classes for better hierarchical editing
 class SubCategoryInline(admin.TabularInline):
@@ -16,7 +18,7 @@ class ProvinceInline(admin.TabularInline):
 class CityInline(admin.TabularInline):
     model = City
     extra = 1
-    fields = ['name']
+    fields = ['name', 'latitude', 'longitude']
 
 class AdMediaInline(admin.TabularInline):
     model = AdMedia
@@ -73,19 +75,37 @@ class ProvinceAdmin(admin.ModelAdmin):
 
 @admin.register(City)
 class CityAdmin(admin.ModelAdmin):
-    list_display = ['name', 'province', 'province_country', 'ad_count']
+    list_display = ['name', 'province', 'province_country', 'latitude', 'longitude', 'ad_count']
     list_filter = ['province__country', 'province']
     search_fields = ['name', 'province__name', 'province__country__name']
     autocomplete_fields = ['province']
     
     def province_country(self, obj):
-        return f"{obj.province.country.name}"
+        return f"{lookup(Province, obj.province_id).country.name}"
     province_country.short_description = 'Country'
     
     def ad_count(self, obj):
         return obj.ad_set.count()
     ad_count.short_description = 'Ads'
 
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    # Saving a rate queues recomputing the normalized prices (see ads.signals)
+    list_display = ['currency_code', 'rate', 'updated_at']
+    search_fields = ['currency_code']
+
+    def has_delete_permission(self, request, obj=None):
+        # Ads priced in the currency could no longer be saved or price-filtered
+        if obj is not None and Ad.objects.filter(currency_code=obj.currency_code).exists():
+            return False
+        return super().has_delete_permission(request, obj)
+
+    def get_actions(self, request):
+        # Bulk deletion would skip the per-rate check above
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
 @admin.register(Ad)
 class AdAdmin(admin.ModelAdmin):
     list_display = [
@@ -101,9 +121,13 @@ class AdAdmin(admin.ModelAdmin):
         'author__last_name', 'subcategory__name', 'city__name'
     ]
     autocomplete_fields = ['author', 'subcategory', 'country', 'province', 'city']
-    readonly_fields = ['views', 'inquiries', 'created_at', 'updated_at', 'is_expired']
+    readonly_fields = [
+        'views', 'inquiries', 'created_at', 'updated_at', 'is_expired',
+        'claimed_by', 'claim_expires_at', 'price_normalized'
+    ]
     date_hierarchy = 'created_at'
     inlines = [AdMediaInline]
+    actions = ['pause_ads', 'resume_ads']
     
     fieldsets = (
         ('Basic Information', {
@@ -113,7 +137,7 @@ class AdAdmin(admin.ModelAdmin):
             'fields': ('subcategory', 'country', 'province', 'city')
         }),
         ('Pricing', {
-            'fields': ('price', 'currency_code', 'currency_symbol')
+            'fields': ('price', 'currency_code', 'currency_symbol', 'price_normalized')
         }),
         ('Ad Settings', {
             'fields': ('ad_type', 'status', 'expires_at')
@@ -124,14 +148,28 @@ class AdAdmin(admin.ModelAdmin):
         ('Media', {
             'fields': ('thumbnail',)
         }),
+        ('Moderation', {
+            'fields': ('claimed_by', 'claim_expires_at'),
+            'classes': ('collapse',)
+        }),
         ('Statistics', {
             'fields': ('views', 'inquiries', 'created_at', 'updated_at', 'is_expired'),
             'classes': ('collapse',)
         })
     )
     
+    @admin.action(description='Pause selected active ads')
+    def pause_ads(self, request, queryset):
+        ids = AdLifecycleService.change_status(queryset, 'pause')
+        self.message_user(request, f"Paused {len(ids)} ads", messages.SUCCESS)
+    
+    @admin.action(description='Resume selected paused ads')
+    def resume_ads(self, request, queryset):
+        ids = AdLifecycleService.change_status(queryset, 'resume')
+        self.message_user(request, f"Resumed {len(ids)} ads", messages.SUCCESS)
+    
     def location_display(self, obj):
-        return f"{obj.city.name}, {obj.province.name}, {obj.country.name}"
+        return f"{location_label(obj.city_id, obj.province_id)}, {name_of(Country, obj.country_id)}"
     location_display.short_description = 'Location'
     
     def price_display(self, obj):
@@ -139,9 +177,8 @@ class AdAdmin(admin.ModelAdmin):
     price_display.short_description = 'Price'
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related(
-            'author', 'subcategory', 'subcategory__category', 'country', 'province', 'city'
-        )
+        # Location and category names come from the reference registry
+        return super().get_queryset(request).select_related('author', 'subcategory')
 
 @admin.register(AdMedia)
 class AdMediaAdmin(admin.ModelAdmin):
@@ -149,7 +186,7 @@ class AdMediaAdmin(admin.ModelAdmin):
     list_filter = ['media_type', 'is_thumbnail', 'upload_date']
     search_fields = ['ad__title', 'ad__author__email']
     autocomplete_fields = ['ad']
-    readonly_fields = ['upload_date']
+    readonly_fields = ['blob', 'upload_date']
     date_hierarchy = 'upload_date'
     
     def ad_title(self, obj):
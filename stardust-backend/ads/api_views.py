@@ -1,63 +1,53 @@
 from rest_framework import status, permissions, viewsets
-from rest_framework.decorators import action, permission_classes
+from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework.pagination import LimitOffsetPagination
-from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import Q
 from django.conf import settings
 from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
-import uuid
+from django.core.cache import cache
 import logging
-import os
 
-from .models import Ad, Category, SubCategory, Country, Province, City, AdMedia
+from config.throttling import SuggestRateThrottle
+from .models import Ad, AdMedia
 from .serializers import (
-    CategoryWithSubcategoriesSerializer, CountryWithProvincesSerializer,
-    CountrySerializer, CountryListSerializer,
     AdCreateSerializer, AdSummarySerializer, AdDetailSerializer,
-    AdUpdateSerializer, UserAdSummarySerializer, AdMediaSerializer,
-    PaginationInfoSerializer
+    AdUpdateSerializer, UserAdSummarySerializer,
+    AdSerializer, AdSummaryProjection, MapClustersQuerySerializer,
+    PriceHistogramQuerySerializer, SuggestQuerySerializer, get_requested_fields, trim_ad_queryset
 )
-from .filters import AdFilter
+from .clusters import build_clusters
+from .counters import get_view_counter
+from .currency import exclude_unrated
+from .facets import build_facets
+from .histogram import build_price_histogram
+from .images import schedule_variants
+from .media import store_uploads, validate_upload
+from .filters import AdFilter, normalized_filter_key
+from .pagination import CustomPagination
+from .reference_data import reference_response
+from .search import AdSearchFilter, AdOrderingFilter
+from .permissions import IsModerator
+from .services import AdBatchService, AdLifecycleService, ModerationService
+from .suggest import get_suggestions
 
 logger = logging.getLogger(__name__)
 
 
-class CustomPagination(LimitOffsetPagination):
-    """Custom pagination class matching OpenAPI spec"""
-    default_limit = 20
-    limit_query_param = 'limit'
-    offset_query_param = 'offset'
-    max_limit = 100
-    
-    def get_paginated_response(self, data):
-        return Response({
-            'data': data,
-            'pagination': {
-                'total': self.count,
-                'limit': self.limit,
-                'offset': self.offset,
-                'has_next': self.get_next_link() is not None,
-                'has_previous': self.get_previous_link() is not None,
-            }
-        })
-
-
 class CategoriesView(APIView):
     """Get all categories and their subcategories"""
     permission_classes = [permissions.AllowAny]
+    # Anonymous and identical for everyone, so proxies can cache it (no Vary: Cookie)
+    authentication_classes = []
     
     def get(self, request):
         try:
-            categories = Category.objects.prefetch_related('subcategories').all()
-            serializer = CategoryWithSubcategoriesSerializer(categories, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return reference_response(request, 'categories')
         except Exception as e:
             logger.error(f"Error fetching categories: {str(e)}")
             return Response(
@@ -72,12 +62,11 @@ class CategoriesView(APIView):
 class CountriesView(APIView):
     """Get all countries"""
     permission_classes = [permissions.AllowAny]
+    authentication_classes = []
     
     def get(self, request):
         try:
-            countries = Country.objects.all()
-            serializer = CountryListSerializer(countries, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return reference_response(request, 'countries')
         except Exception as e:
             logger.error(f"Error fetching countries: {str(e)}")
             return Response(
@@ -92,14 +81,11 @@ class CountriesView(APIView):
 class LocationsView(APIView):
     """Get supported countries, provinces, and cities"""
     permission_classes = [permissions.AllowAny]
+    authentication_classes = []
     
     def get(self, request):
         try:
-            countries = Country.objects.prefetch_related(
-                'provinces__cities'
-            ).all()
-            serializer = CountrySerializer(countries, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return reference_response(request, 'locations')
         except Exception as e:
             logger.error(f"Error fetching locations: {str(e)}")
             return Response(
@@ -113,25 +99,29 @@ class LocationsView(APIView):
 
 class AdViewSet(viewsets.ModelViewSet):
     """Main Ad ViewSet with CRUD operations"""
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, AdSearchFilter, AdOrderingFilter]
     filterset_class = AdFilter
-    search_fields = ['title', 'description']
-    ordering_fields = ['created_at', 'price', 'title']
+    ordering_fields = ['created_at', 'price', 'title', 'distance']
     ordering = ['-created_at']
     pagination_class = CustomPagination
+    public_actions = ['list', 'retrieve', 'facets', 'clusters', 'price_histogram', 'suggest']
     
     def get_queryset(self):
-        if self.action in ['list', 'retrieve']:
-            # Public endpoints - only show active ads
-            return Ad.objects.filter(status='active').select_related(
-                'subcategory__category', 'country', 'province', 'city', 'author'
-            ).prefetch_related('media')
+        if self.action in self.public_actions:
+            # Public endpoints - only show active ads. Listings are projected
+            # to plain rows (see list()); details load only the columns,
+            # joins and prefetches that the requested fields need.
+            queryset = Ad.objects.filter(status='active').defer('search_vector')
+            if self.action == 'retrieve':
+                fields = get_requested_fields(self.request, AdDetailSerializer.Meta.fields)
+                queryset = trim_ad_queryset(queryset, fields)
+            return queryset
         else:
             # Authenticated endpoints - show user's own ads
             if self.request.user.is_authenticated:
-                return Ad.objects.filter(author=self.request.user).select_related(
-                    'subcategory__category', 'country', 'province', 'city'
-                ).prefetch_related('media')
+                return Ad.objects.filter(author=self.request.user).prefetch_related(
+                    'media'
+                ).defer('search_vector')
             return Ad.objects.none()
     
     def get_serializer_class(self):
@@ -144,12 +134,27 @@ class AdViewSet(viewsets.ModelViewSet):
         return AdSummarySerializer
     
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in self.public_actions:
             permission_classes = [permissions.AllowAny]
         else:
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
     
+    def get_throttles(self):
+        if self.action == 'suggest':
+            # A request per keystroke would exhaust the default anon rate
+            return [SuggestRateThrottle()]
+        return super().get_throttles()
+    
+    def list(self, request, *args, **kwargs):
+        projection = AdSummaryProjection.from_request(request)
+        queryset = projection.project(self.filter_queryset(self.get_queryset()))
+        
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(projection.serialize(page))
+        return Response(projection.serialize(queryset))
+    
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
@@ -187,12 +192,65 @@ class AdViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch_create(self, request):
+        """Create up to ADS_BATCH_CREATE_MAX_SIZE ads in one request"""
+        items = request.data.get('ads') if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            return Response(
+                {
+                    "error": "validation_error",
+                    "message": "Request body must contain a non-empty 'ads' array"
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > settings.ADS_BATCH_CREATE_MAX_SIZE:
+            return Response(
+                {
+                    "error": "validation_error",
+                    "message": f"A batch may contain at most {settings.ADS_BATCH_CREATE_MAX_SIZE} ads"
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            results = AdBatchService.create_ads(request.user, items)
+        except Exception as e:
+            logger.error(f"Error batch creating ads: {str(e)}")
+            return Response(
+                {
+                    "error": "creation_failed",
+                    "message": "Failed to create ads. Please try again."
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        created = sum(1 for result in results if result["status"] == "created")
+        if created == len(results):
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(
+            {
+                "created": created,
+                "failed": len(results) - created,
+                "results": results
+            },
+            status=response_status
+        )
+    
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         
-        # Increment view count
-        Ad.objects.filter(id=instance.id).update(views=instance.views + 1)
-        instance.refresh_from_db()
+        # Buffer the view; it is written to Ad.views by flush_view_counts
+        try:
+            pending = get_view_counter().increment(instance.id)
+            if 'views' not in instance.get_deferred_fields():
+                instance.views += pending
+        except Exception as e:
+            logger.warning(f"Could not record view for ad {instance.id}: {str(e)}")
         
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
@@ -254,6 +312,160 @@ class AdViewSet(viewsets.ModelViewSet):
         logger.info(f"Ad deleted: {instance.id} by user {request.user.id}")
         return Response(status=status.HTTP_204_NO_CONTENT)
     
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Per-facet counts for the ads matching the list filters and search"""
+        # Invalid filter values raise a 400 here, before any SQL runs
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            key = normalized_filter_key('ads:facets', request)
+            payload = cache.get(key)
+            if payload is None:
+                payload = build_facets(queryset)
+                cache.set(key, payload, settings.ADS_FACETS_CACHE_TIMEOUT)
+            return Response(payload)
+        except Exception as e:
+            logger.error(f"Error computing ad facets: {str(e)}")
+            return Response(
+                {
+                    "error": "internal_server_error",
+                    "message": "An unexpected error occurred. Please try again later."
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    
+    @action(detail=False, methods=['get'])
+    def price_histogram(self, request):
+        """Bucketed price counts for the ads matching the list filters and search.
+
+        With ``currency`` (or a ``currency_code`` filter) the raw prices of
+        ads in that currency are bucketed, otherwise the prices of all ads
+        converted to the base currency (leaving out currencies with no rate).
+        """
+        params = PriceHistogramQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = self.filter_queryset(self.get_queryset())
+        currency = params.validated_data.get('currency') or request.query_params.get('currency_code')
+        if currency:
+            queryset, column = queryset.filter(currency_code=currency), 'price'
+        else:
+            queryset = exclude_unrated(queryset)
+            currency, column = settings.ADS_BASE_CURRENCY, 'price_normalized'
+        try:
+            key = normalized_filter_key('ads:price_histogram', request)
+            payload = cache.get(key)
+            if payload is None:
+                payload = build_price_histogram(
+                    queryset, column, currency,
+                    params.validated_data['buckets'], params.validated_data['scale']
+                )
+                cache.set(key, payload, settings.ADS_PRICE_HISTOGRAM_CACHE_TIMEOUT)
+            return Response(payload)
+        except Exception as e:
+            logger.error(f"Error computing price histogram: {str(e)}")
+            return Response(
+                {
+                    "error": "internal_server_error",
+                    "message": "An unexpected error occurred. Please try again later."
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Completions of the search box text ``q``: active ad titles that
+        start with it, most frequent first. List filters do not apply."""
+        params = SuggestQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        try:
+            return Response({
+                'query': params.validated_data['q'],
+                'suggestions': get_suggestions(params.validated_data['q'], params.validated_data['limit']),
+            })
+        except Exception as e:
+            logger.error(f"Error computing search suggestions: {str(e)}")
+            return Response(
+                {
+                    "error": "internal_server_error",
+                    "message": "An unexpected error occurred. Please try again later."
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    
+    @action(detail=False, methods=['get'])
+    def clusters(self, request):
+        """Ad counts per map grid cell inside ``bbox`` at ``zoom``, for the
+        ads matching the list filters and search"""
+        params = MapClustersQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            key = normalized_filter_key('ads:clusters', request, ignore={'bbox', 'zoom'})
+            payload = build_clusters(
+                queryset, params.validated_data['bbox'], params.validated_data['zoom'], key
+            )
+            return Response(payload)
+        except Exception as e:
+            logger.error(f"Error computing map clusters: {str(e)}")
+            return Response(
+                {
+                    "error": "internal_server_error",
+                    "message": "An unexpected error occurred. Please try again later."
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    
+    def get_bulk_queryset(self, request):
+        """The requester's ads selected by ``ids`` or an AdFilter ``filter`` object"""
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        filters = request.data.get('filter') if isinstance(request.data, dict) else None
+        queryset = Ad.objects.filter(author=request.user)
+        
+        if ids is not None:
+            if (not isinstance(ids, list) or not ids
+                    or not all(isinstance(ad_id, int) for ad_id in ids)):
+                raise ValidationError({"ids": "Must be a non-empty list of ad ids"})
+            if len(ids) > settings.ADS_BULK_ACTION_MAX_IDS:
+                raise ValidationError({"ids": f"At most {settings.ADS_BULK_ACTION_MAX_IDS} ids per request"})
+            return queryset.filter(id__in=ids)
+        
+        if isinstance(filters, dict):
+            filterset = AdFilter(data=filters, queryset=queryset, request=request)
+            if not filterset.is_valid():
+                raise ValidationError({"filter": filterset.errors})
+            return filterset.qs
+        
+        raise ValidationError({"non_field_errors": "Provide either 'ids' or a 'filter' object"})
+    
+    def bulk_response(self, action_name, ids):
+        return Response(
+            {
+                "action": action_name,
+                "count": len(ids),
+                "affected_ids": ids
+            },
+            status=status.HTTP_200_OK
+        )
+    
+    @action(detail=False, methods=['post'], url_path='bulk/pause')
+    def bulk_pause(self, request):
+        """Pause many of the requester's active ads"""
+        ids = AdLifecycleService.change_status(self.get_bulk_queryset(request), 'pause')
+        return self.bulk_response('pause', ids)
+    
+    @action(detail=False, methods=['post'], url_path='bulk/resume')
+    def bulk_resume(self, request):
+        """Reactivate many of the requester's paused ads"""
+        ids = AdLifecycleService.change_status(self.get_bulk_queryset(request), 'resume')
+        return self.bulk_response('resume', ids)
+    
+    @action(detail=False, methods=['post'], url_path='bulk/delete')
+    def bulk_delete(self, request):
+        """Delete many of the requester's ads"""
+        ids = AdLifecycleService.delete(self.get_bulk_queryset(request))
+        logger.info(f"Ads bulk deleted by user {request.user.id}: {len(ids)}")
+        return self.bulk_response('delete', ids)
+    
     @action(detail=True, methods=['post'])
     def deactivate(self, request, pk=None):
         """Pause an ad manually"""
@@ -341,69 +553,53 @@ class AdViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        uploaded_files = []
+        # Reject the whole request before anything is written
+        for file in files:
+            invalid = validate_upload(file)
+            if invalid:
+                error, message, status_code = invalid
+                return Response({"error": error, "message": message}, status=status_code)
+        
+        # Phase 1: write the files, outside any transaction
+        try:
+            blobs = store_uploads(files)
+        except Exception as e:
+            logger.error(f"Error storing media for ad {ad.id}: {str(e)}")
+            return Response(
+                {
+                    "error": "upload_failed",
+                    "message": "Failed to upload images. Please try again."
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        uploaded_files = [
+            {
+                "filename": file.name,
+                "url": default_storage.url(blob.path),
+                "size": file.size
+            }
+            for file, blob in zip(files, blobs)
+        ]
         
+        # Phase 2: record them in one short transaction
         try:
             with transaction.atomic():
-                for file in files:
-                    # Validate file size
-                    if file.size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
-                        return Response(
-                            {
-                                "error": "file_too_large",
-                                "message": "File size exceeds 5MB limit"
-                            },
-                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
-                        )
-                    
-                    # Validate file extension
-                    file_ext = os.path.splitext(file.name)[1].lower()
-                    if file_ext not in settings.ALLOWED_IMAGE_EXTENSIONS:
-                        return Response(
-                            {
-                                "error": "invalid_file_type",
-                                "message": f"Only {', '.join(settings.ALLOWED_IMAGE_EXTENSIONS)} files are allowed"
-                            },
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                    
-                    # Generate unique filename
-                    filename = f"ads/{ad.id}/{uuid.uuid4()}{file_ext}"
-                    
-                    # Save file
-                    saved_path = default_storage.save(filename, ContentFile(file.read()))
-                    file_url = default_storage.url(saved_path)
-                    
-                    # Create AdMedia record
-                    media = AdMedia.objects.create(
-                        ad=ad,
-                        file_url=file_url,
-                        media_type='image'
+                created_media = AdMedia.objects.bulk_create([
+                    AdMedia(
+                        ad=ad, blob_id=blob.id, file_url=uploaded["url"],
+                        file_path=blob.path, media_type='image'
                     )
-                    
-                    uploaded_files.append({
-                        "filename": file.name,
-                        "url": file_url,
-                        "size": file.size
-                    })
+                    for uploaded, blob in zip(uploaded_files, blobs)
+                ])
                 
                 # Set first image as thumbnail if no thumbnail exists
-                if not ad.thumbnail and uploaded_files:
-                    ad.thumbnail = uploaded_files[0]["url"]
-                    ad.save()
-                
-                logger.info(f"Media uploaded for ad {ad.id}: {len(uploaded_files)} files")
-                return Response(
-                    {
-                        "uploaded_files": uploaded_files,
-                        "total_uploaded": len(uploaded_files),
-                        "message": f"{len(uploaded_files)} images uploaded successfully"
-                    },
-                    status=status.HTTP_200_OK
-                )
-                
+                Ad.objects.filter(id=ad.id).filter(
+                    Q(thumbnail__isnull=True) | Q(thumbnail='')
+                ).update(thumbnail=uploaded_files[0]["url"], updated_at=timezone.now())
         except Exception as e:
-            logger.error(f"Error uploading media for ad {ad.id}: {str(e)}")
+            # The stored blobs stay unreferenced and are collected later
+            logger.error(f"Error recording media for ad {ad.id}: {str(e)}")
             return Response(
                 {
                     "error": "upload_failed",
@@ -411,6 +607,17 @@ class AdViewSet(viewsets.ModelViewSet):
                 },
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        
+        schedule_variants([media.id for media in created_media])
+        logger.info(f"Media uploaded for ad {ad.id}: {len(uploaded_files)} files")
+        return Response(
+            {
+                "uploaded_files": uploaded_files,
+                "total_uploaded": len(uploaded_files),
+                "message": f"{len(uploaded_files)} images uploaded successfully"
+            },
+            status=status.HTTP_200_OK
+        )
 
 
 class UserAdsView(APIView):
@@ -421,9 +628,10 @@ class UserAdsView(APIView):
     def get(self, request):
         status_filter = request.query_params.get('status')
         
-        queryset = Ad.objects.filter(author=request.user).select_related(
-            'subcategory__category', 'country', 'province', 'city'
-        ).prefetch_related('media')
+        fields = get_requested_fields(request, UserAdSummarySerializer.Meta.fields)
+        queryset = trim_ad_queryset(
+            Ad.objects.filter(author=request.user).order_by('-created_at', '-id'), fields
+        )
         
         if status_filter:
             queryset = queryset.filter(status=status_filter)
@@ -433,8 +641,95 @@ class UserAdsView(APIView):
         page = paginator.paginate_queryset(queryset, request)
         
         if page is not None:
-            serializer = UserAdSummarySerializer(page, many=True)
+            if 'views' in fields:
+                self.add_pending_views(page)
+            serializer = UserAdSummarySerializer(page, many=True, context={'request': request})
             return paginator.get_paginated_response(serializer.data)
         
-        serializer = UserAdSummarySerializer(queryset, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        serializer = UserAdSummarySerializer(queryset, many=True, context={'request': request})
+        return Response(serializer.data)
+    
+    def add_pending_views(self, ads):
+        """Include views that are buffered but not yet flushed"""
+        try:
+            pending = get_view_counter().pending([ad.id for ad in ads])
+        except Exception as e:
+            logger.warning(f"Could not read pending views: {str(e)}")
+            return
+        for ad in ads:
+            ad.views += pending.get(ad.id, 0)
+
+
+class ModerationQueueView(APIView):
+    """Queue depth and the ads the current moderator holds"""
+    permission_classes = [IsModerator]
+    
+    def get(self, request):
+        claims = ModerationService.held_claims(request.user).prefetch_related(
+            'media'
+        ).order_by('created_at', 'id')
+        return Response({
+            "queue": ModerationService.queue_stats(),
+            "claimed": AdSerializer(claims, many=True).data
+        })
+
+
+class ModerationClaimView(APIView):
+    """Claim the next pending ads for review"""
+    permission_classes = [IsModerator]
+    
+    def post(self, request):
+        try:
+            # A JSON array or scalar body has no 'limit' to read
+            data = request.data if isinstance(request.data, dict) else {'limit': None}
+            limit = int(data.get('limit', settings.ADS_MODERATION_DEFAULT_CLAIM))
+        except (TypeError, ValueError):
+            limit = 0
+        if not 1 <= limit <= settings.ADS_MODERATION_MAX_CLAIM:
+            return Response(
+                {
+                    "error": "validation_error",
+                    "message": f"limit must be between 1 and {settings.ADS_MODERATION_MAX_CLAIM}"
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        ids, lease_expires_at = ModerationService.claim(request.user, limit)
+        ads = Ad.objects.filter(id__in=ids).prefetch_related(
+            'media'
+        ).order_by('created_at', 'id')
+        return Response({
+            "lease_expires_at": lease_expires_at,
+            "claimed": AdSerializer(ads, many=True).data
+        })
+
+
+class ModerationDecisionView(APIView):
+    """Approve, reject or release claimed ads (``decision`` set in urls.py)"""
+    permission_classes = [IsModerator]
+    decision = None
+    
+    def post(self, request):
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if (not isinstance(ids, list) or not ids
+                or not all(isinstance(ad_id, int) for ad_id in ids)):
+            return Response(
+                {
+                    "error": "validation_error",
+                    "message": "ids must be a non-empty list of ad ids"
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if self.decision == 'release':
+            changed = ModerationService.release(request.user, ids)
+        else:
+            changed = ModerationService.decide(request.user, ids, self.decision)
+        
+        # Ads not changed were never claimed by this moderator or their lease ran out
+        return Response({
+            "decision": self.decision,
+            "count": len(changed),
+            "affected_ids": changed,
+            "skipped_ids": sorted(set(ids) - set(changed))
+        })
@@ -0,0 +1,131 @@
+"""Clustered ad counts for the map view.
+
+The map is divided into a grid of square cells of ``360 / 2**zoom /
+ADS_MAP_TILE_CELLS`` degrees; ads are placed at their city's coordinates.
+Cells are grouped into tiles of ``ADS_MAP_TILE_CELLS`` x
+``ADS_MAP_TILE_CELLS`` cells, and each tile's clusters are cached per
+listing filter, so panning only computes the tiles that came into view.
+All missing tiles of a request are counted by one grouped query.
+"""
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .models import City
+from .registry import get_registry
+
+
+def cell_degrees(zoom):
+    return 360 / 2 ** zoom / settings.ADS_MAP_TILE_CELLS
+
+
+def cell_range(low, high, origin, size, count):
+    """Indexes of the cells of ``size`` degrees from ``origin`` that overlap [low, high]"""
+    first = int(math.floor((low - origin) / size))
+    last = int(math.floor((high - origin) / size))
+    return max(first, 0), min(last, count - 1)
+
+
+def tile_ranges(bbox, zoom):
+    """``((x0, x1), (y0, y1))`` tile indexes covering ``bbox``"""
+    south, west, north, east = bbox
+    size = cell_degrees(zoom) * settings.ADS_MAP_TILE_CELLS
+    return (
+        cell_range(west, east, -180, size, 2 ** zoom),
+        cell_range(south, north, -90, size, max(2 ** zoom // 2, 1)),
+    )
+
+
+def count_cells(queryset, zoom, tiles_x, tiles_y):
+    """``{(tile_x, tile_y): [(x, y, count, latitude, longitude), ...]}`` for
+    every tile in the given ranges, in one grouped query"""
+    cell = cell_degrees(zoom)
+    tile = cell * settings.ADS_MAP_TILE_CELLS
+    tiles = {
+        (tile_x, tile_y): []
+        for tile_x in range(tiles_x[0], tiles_x[1] + 1)
+        for tile_y in range(tiles_y[0], tiles_y[1] + 1)
+    }
+    # Only ads in the cities inside the tiles are read, via the city index
+    city_ids = get_registry().city_index.in_box(
+        tiles_y[0] * tile - 90, tiles_x[0] * tile - 180,
+        (tiles_y[1] + 1) * tile - 90, (tiles_x[1] + 1) * tile - 180,
+    )
+    if not city_ids or queryset.query.is_empty():
+        return tiles
+
+    sql, params = queryset.filter(city_id__in=city_ids).order_by().values('city_id').query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        # Ads are counted per city first, then the few city rows per cell
+        cursor.execute(
+            f"SELECT FLOOR((c.longitude + 180) / %s)::int AS x, "
+            f"  FLOOR((c.latitude + 90) / %s)::int AS y, "
+            f"  SUM(a.ads), SUM(c.latitude * a.ads) / SUM(a.ads), SUM(c.longitude * a.ads) / SUM(a.ads) "
+            f"FROM (SELECT f.city_id, COUNT(*) AS ads FROM ({sql}) f GROUP BY f.city_id) a "
+            f"JOIN {City._meta.db_table} c ON c.id = a.city_id "
+            f"GROUP BY 1, 2",
+            [cell, cell, *params]
+        )
+        rows = cursor.fetchall()
+
+    for x, y, count, latitude, longitude in rows:
+        key = (x // settings.ADS_MAP_TILE_CELLS, y // settings.ADS_MAP_TILE_CELLS)
+        # Floating point rounding can put a city on a tile edge just outside
+        if key in tiles:
+            tiles[key].append((x, y, int(count), latitude, longitude))
+    return tiles
+
+
+def build_clusters(queryset, bbox, zoom, filter_key):
+    """Clusters of ``queryset`` in the cells overlapping ``bbox``.
+
+    Tiles are read from the cache under ``<filter_key>:<zoom>:<x>:<y>``;
+    the bounding range of the missing ones is counted and cached.
+    """
+    tiles_x, tiles_y = tile_ranges(bbox, zoom)
+    keys = {
+        (tile_x, tile_y): f"{filter_key}:{zoom}:{tile_x}:{tile_y}"
+        for tile_x in range(tiles_x[0], tiles_x[1] + 1)
+        for tile_y in range(tiles_y[0], tiles_y[1] + 1)
+    }
+    cached = cache.get_many(keys.values())
+    tiles = {tile: cached[key] for tile, key in keys.items() if key in cached}
+
+    missing = [tile for tile in keys if tile not in tiles]
+    if missing:
+        counted = count_cells(
+            queryset, zoom,
+            (min(x for x, _ in missing), max(x for x, _ in missing)),
+            (min(y for _, y in missing), max(y for _, y in missing)),
+        )
+        cache.set_many(
+            {keys[tile]: cells for tile, cells in counted.items()},
+            settings.ADS_MAP_CLUSTERS_CACHE_TIMEOUT
+        )
+        tiles.update(counted)
+
+    cell = cell_degrees(zoom)
+    south, west, north, east = bbox
+    cells_x = cell_range(west, east, -180, cell, 2 ** zoom * settings.ADS_MAP_TILE_CELLS)
+    cells_y = cell_range(south, north, -90, cell, max(2 ** zoom // 2, 1) * settings.ADS_MAP_TILE_CELLS)
+    clusters = [
+        {
+            'cell': f"{zoom}/{x}/{y}",
+            'count': count,
+            'latitude': round(latitude, 6),
+            'longitude': round(longitude, 6),
+            'bounds': [y * cell - 90, x * cell - 180, (y + 1) * cell - 90, (x + 1) * cell - 180],
+        }
+        for tile in keys
+        for x, y, count, latitude, longitude in tiles[tile]
+        if cells_x[0] <= x <= cells_x[1] and cells_y[0] <= y <= cells_y[1]
+    ]
+    clusters.sort(key=lambda cluster: -cluster['count'])
+    return {
+        'zoom': zoom,
+        'cell_size': cell,
+        'total': sum(cluster['count'] for cluster in clusters),
+        'clusters': clusters,
+    }
@@ -0,0 +1,207 @@
+"""Buffered (write-behind) view counting for ads.
+
+Detail views only increment a shared counter store; ``flush_view_counts``
+periodically moves the accumulated deltas into ``Ad.views`` with batched
+``UPDATE ... FROM (VALUES ...)`` statements. Increments are atomic in the
+store, so concurrent hits are never lost and hot rows are not locked per
+request.
+"""
+import logging
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Ad
+
+logger = logging.getLogger(__name__)
+
+
+class BaseViewCounter:
+    """Interface for pending view-count stores"""
+
+    def increment(self, ad_id, amount=1):
+        """Add ``amount`` views to ``ad_id`` and return its pending delta"""
+        raise NotImplementedError
+
+    def pending(self, ad_ids):
+        """Return ``{ad_id: pending delta}`` for the given ads (missing = 0)"""
+        raise NotImplementedError
+
+    def drain(self):
+        """Take all pending deltas as ``{ad_id: delta}``. The store keeps
+        them aside until ``done()``, so a flush that dies before writing
+        them leaves them for the next one"""
+        raise NotImplementedError
+
+    def done(self):
+        """The deltas from the last ``drain()`` are written; forget them"""
+
+    def restore(self, deltas):
+        """Put drained deltas back, e.g. after a failed flush"""
+        for ad_id, delta in deltas.items():
+            self.increment(ad_id, delta)
+
+
+class LocalViewCounter(BaseViewCounter):
+    """In-process store for tests.
+
+    Counts live in the memory of the process that served the request, which
+    the Celery flush task never sees, so it must not be used by a server.
+    """
+
+    def __init__(self, **options):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def increment(self, ad_id, amount=1):
+        with self._lock:
+            self._counts[ad_id] = self._counts.get(ad_id, 0) + amount
+            return self._counts[ad_id]
+
+    def pending(self, ad_ids):
+        with self._lock:
+            return {ad_id: self._counts.get(ad_id, 0) for ad_id in ad_ids}
+
+    def drain(self):
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        return counts
+
+
+class RedisViewCounter(BaseViewCounter):
+    """Redis hash of ``ad_id -> pending views`` shared by all workers.
+
+    A flush renames the hash to a batch key listed in ``<key>:batches``, so
+    increments arriving meanwhile start a new hash, and deletes the batches
+    only once their views are in the database: a flush that dies leaves them
+    listed for the next one. A lock keeps flushes from taking the same
+    batches twice; it expires after ``flush_timeout`` seconds in case its
+    holder dies.
+    """
+
+    def __init__(self, url=None, key='ads:views:pending', flush_timeout=600, **options):
+        import redis
+
+        url = url or settings.REDIS_URL or settings.CELERY_BROKER_URL
+        if not url.startswith(('redis://', 'rediss://', 'unix://')):
+            raise ImproperlyConfigured(
+                f"RedisViewCounter needs a Redis URL shared by the web workers and the "
+                f"flush task; set REDIS_URL (got {url!r})"
+            )
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+        self.batches_key = f"{key}:batches"
+        self.lock_key = f"{key}:lock"
+        self.flush_timeout = flush_timeout
+        self.draining = []
+
+    def increment(self, ad_id, amount=1):
+        return int(self.client.hincrby(self.key, ad_id, amount))
+
+    def pending(self, ad_ids):
+        ad_ids = list(ad_ids)
+        if not ad_ids:
+            return {}
+        values = self.client.hmget(self.key, ad_ids)
+        return {ad_id: int(value or 0) for ad_id, value in zip(ad_ids, values)}
+
+    def drain(self):
+        if not self.client.set(self.lock_key, 1, nx=True, ex=self.flush_timeout):
+            logger.info("Another view count flush is running")
+            self.draining = []
+            return {}
+        batch_key = f"{self.key}:flushing:{uuid.uuid4().hex}"
+        pipe = self.client.pipeline()
+        pipe.sadd(self.batches_key, batch_key)
+        pipe.rename(self.key, batch_key)
+        # RENAME fails when nothing is pending; the batch is then just empty
+        pipe.execute(raise_on_error=False)
+
+        self.draining = sorted(self.client.smembers(self.batches_key))
+        pipe = self.client.pipeline(transaction=False)
+        for key in self.draining:
+            pipe.hgetall(key)
+        counts = {}
+        for batch in pipe.execute():
+            for ad_id, delta in batch.items():
+                counts[int(ad_id)] = counts.get(int(ad_id), 0) + int(delta)
+        return counts
+
+    def done(self):
+        pipe = self.client.pipeline()
+        if self.draining:
+            pipe.delete(*self.draining)
+            pipe.srem(self.batches_key, *self.draining)
+        pipe.delete(self.lock_key)
+        pipe.execute()
+        self.draining = []
+
+    def restore(self, deltas):
+        # The batches are still listed; the next flush takes them again
+        if self.draining:
+            self.client.delete(self.lock_key)
+            self.draining = []
+
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def get_view_counter():
+    """Return the process-wide counter configured by ``ADS_VIEW_COUNTER``"""
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                config = settings.ADS_VIEW_COUNTER
+                backend = import_string(config['BACKEND'])
+                _counter = backend(**config.get('OPTIONS', {}))
+    return _counter
+
+
+@receiver(setting_changed)
+def reset_view_counter(setting, **kwargs):
+    global _counter
+    if setting == 'ADS_VIEW_COUNTER':
+        _counter = None
+
+
+def flush_view_counts(counter=None, batch_size=1000):
+    """Apply all pending view deltas to ``Ad.views``; return rows updated"""
+    counter = counter or get_view_counter()
+    deltas = counter.drain()
+    if not deltas:
+        counter.done()
+        return 0
+
+    # Sorted so concurrent flushes lock rows in the same order
+    items = sorted(deltas.items())
+    table = Ad._meta.db_table
+    updated = 0
+    try:
+        with transaction.atomic():
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                values = ', '.join(['(%s::bigint, %s::integer)'] * len(batch))
+                params = [value for item in batch for value in item]
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"UPDATE {table} SET views = {table}.views + v.delta "
+                        f"FROM (VALUES {values}) AS v(id, delta) "
+                        f"WHERE {table}.id = v.id",
+                        params
+                    )
+                    updated += cursor.rowcount
+    except Exception:
+        counter.restore(deltas)
+        raise
+    counter.done()
+
+    logger.info(f"Flushed {sum(deltas.values())} ad views across {updated} ads")
+    return updated
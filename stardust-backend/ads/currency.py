@@ -0,0 +1,78 @@
+"""Converting ad prices into the base currency.
+
+Rates come from the reference registry, so normalizing a price on write
+costs no query. When a rate changes, ``PriceService.renormalize``
+recomputes ``Ad.price_normalized`` for that currency in batches, from a
+Celery task queued by ``ads.signals`` or synchronously from
+``manage.py update_exchange_rates``.
+"""
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+
+from .models import Ad, ExchangeRate
+from .registry import get_registry, reload_registry
+
+logger = logging.getLogger(__name__)
+
+
+CENT = Decimal('0.01')
+# Normalized prices keep more places than cents: one US cent is about 17
+# Malawi kwacha, so rounding to base-currency cents would merge distinct
+# prices and make price bounds match the wrong ads
+NORMALIZED_PLACES = Ad._meta.get_field('price_normalized').decimal_places
+NORMALIZED_QUANTUM = Decimal(1).scaleb(-NORMALIZED_PLACES)
+
+
+def get_rate(currency_code):
+    """Value of one unit of ``currency_code`` in the base currency, or None"""
+    if currency_code == settings.ADS_BASE_CURRENCY:
+        return Decimal(1)
+    registry = get_registry()
+    if currency_code not in registry.exchange_rates:
+        # Possibly added since the snapshot was taken (see ads.registry)
+        registry = get_registry(check=True)
+        if (currency_code not in registry.exchange_rates
+                and ExchangeRate.objects.filter(currency_code=currency_code).exists()):
+            registry = reload_registry(registry)
+    return registry.exchange_rates.get(currency_code)
+
+
+def unrated_currencies():
+    """Ad currencies with no exchange rate; their prices cannot be compared"""
+    return [code for code, symbol in Ad.CURRENCY_CHOICES if get_rate(code) is None]
+
+
+def exclude_unrated(queryset):
+    """``queryset`` without ads whose price cannot be compared across
+    currencies: those in a currency with no rate, and those whose rate was
+    added so recently that their prices are not converted yet"""
+    unrated = unrated_currencies()
+    if unrated:
+        queryset = queryset.exclude(currency_code__in=unrated)
+    return queryset.filter(price_normalized__isnull=False)
+
+
+def normalize_price(price, currency_code):
+    """``price`` in the base currency, to ``NORMALIZED_PLACES`` places.
+
+    Raises ValueError when ``currency_code`` has no exchange rate; callers
+    validate the currency first.
+    """
+    rate = get_rate(currency_code)
+    if rate is None:
+        raise ValueError(f"No exchange rate for {currency_code}")
+    # Rounds like Postgres ROUND() in PriceService.renormalize
+    return (Decimal(price) * rate).quantize(NORMALIZED_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+def schedule_renormalization(currency_codes):
+    """Queue recomputing Ad.price_normalized for ``currency_codes``"""
+    from .tasks import renormalize_prices
+
+    try:
+        renormalize_prices.delay(list(currency_codes))
+    except Exception as e:
+        # Broker unavailable: `manage.py update_exchange_rates --all` catches up
+        logger.warning(f"Could not queue price renormalization for {currency_codes}: {str(e)}")
@@ -0,0 +1,68 @@
+from django.db import connections
+
+from .models import Ad
+from .registry import get_registry
+
+
+# Facet name -> Ad column
+FACET_COLUMNS = {
+    'subcategory': 'subcategory_id',
+    'city': 'city_id',
+    'ad_type': 'ad_type',
+    'currency_code': 'currency_code',
+}
+
+
+def facet_counts(queryset):
+    """Count ``queryset`` per value of every facet in one grouped query.
+
+    The filtered listing query becomes a subquery and a single
+    ``GROUP BY GROUPING SETS`` pass produces the counts for all facets.
+    """
+    if queryset.query.is_empty():
+        # Compiling a .none() queryset raises EmptyResultSet
+        return {facet: {} for facet in FACET_COLUMNS}
+    columns = list(FACET_COLUMNS.values())
+    sql, params = queryset.order_by().values(*columns).query.sql_with_params()
+    column_list = ', '.join(f'f.{column}' for column in columns)
+    groupings = ', '.join(f'GROUPING(f.{column})' for column in columns)
+    grouping_sets = ', '.join(f'(f.{column})' for column in columns)
+
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f"SELECT {column_list}, {groupings}, COUNT(*) "
+            f"FROM ({sql}) f GROUP BY GROUPING SETS ({grouping_sets})",
+            params
+        )
+        rows = cursor.fetchall()
+
+    width = len(columns)
+    counts = {facet: {} for facet in FACET_COLUMNS}
+    for row in rows:
+        values, grouped, count = row[:width], row[width:2 * width], row[-1]
+        # Exactly one column is grouped (GROUPING() = 0) in each row
+        index = grouped.index(0)
+        counts[list(FACET_COLUMNS)[index]][values[index]] = count
+    return counts
+
+
+def build_facets(queryset):
+    """Facet counts with display labels, most common values first"""
+    counts = facet_counts(queryset)
+    registry = get_registry()
+    labels = {
+        'subcategory': {pk: subcategory.name for pk, subcategory in registry.subcategories.items()},
+        'city': {pk: city.name for pk, city in registry.cities.items()},
+        'ad_type': dict(Ad.AD_TYPE_CHOICES),
+        'currency_code': {code: symbol for code, symbol in Ad.CURRENCY_CHOICES},
+    }
+    return {
+        'total': sum(counts['ad_type'].values()),
+        'facets': {
+            facet: [
+                {'value': value, 'label': labels[facet].get(value, value), 'count': count}
+                for value, count in sorted(values.items(), key=lambda item: -item[1])
+            ]
+            for facet, values in counts.items()
+        }
+    }
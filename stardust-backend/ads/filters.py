@@ -1,18 +1,185 @@
+import hashlib
+import json
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import FloatField, Func, JSONField, TextField, Value
+from django.db.models.functions import Cast
 from django_filters import rest_framework as filters
-from .models import Ad
+from .currency import exclude_unrated, get_rate, normalize_price
+from .models import Ad, Category, SubCategory, Country, Province, City
+from .registry import get_registry, lookup
+
+
+class ReferenceChoiceField(forms.IntegerField):
+    """ID of a taxonomy/geography row, validated against the reference
+    registry instead of a query per request"""
+    default_error_messages = {
+        'invalid_choice': 'Select a valid choice. That choice is not one of the available choices.',
+    }
+
+    def __init__(self, model, **kwargs):
+        self.model = model
+        super().__init__(**kwargs)
+
+    def clean(self, value):
+        pk = super().clean(value)
+        if pk is None:
+            return None
+        instance = lookup(self.model, pk)
+        if instance is None:
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return instance
+
+
+def city_distance(distances):
+    """Expression giving each row's ``distances[city_id]``.
+
+    The ``{city_id: km}`` map is sent as one jsonb parameter and probed by
+    key, so the SQL and the per-row cost stay flat however many cities
+    are in range.
+    """
+    return Cast(
+        Func(
+            Cast(Value(json.dumps(distances)), JSONField()),
+            Cast('city_id', TextField()),
+            function='jsonb_extract_path_text',
+            output_field=TextField()
+        ),
+        FloatField()
+    )
+
+
+class ReferenceFilter(filters.Filter):
+    field_class = ReferenceChoiceField
+
+
+class PointField(forms.CharField):
+    """``"<latitude>,<longitude>"`` in decimal degrees, cleaned to a float pair"""
+    default_error_messages = {
+        'invalid_point': 'Enter a point as "latitude,longitude" in decimal degrees.',
+    }
+
+    def clean(self, value):
+        value = super().clean(value)
+        if not value:
+            return None
+        try:
+            latitude, longitude = (float(part) for part in value.split(','))
+        except ValueError:
+            raise ValidationError(self.error_messages['invalid_point'], code='invalid_point')
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValidationError(self.error_messages['invalid_point'], code='invalid_point')
+        return latitude, longitude
+
+
+class PointFilter(filters.Filter):
+    field_class = PointField
+
+
+def price_bound_currency(cleaned_data):
+    """Currency ``min_price``/``max_price`` are given in: ``price_currency``,
+    else the ``currency_code`` filter, else the base currency"""
+    return (
+        cleaned_data.get('price_currency')
+        or cleaned_data.get('currency_code')
+        or settings.ADS_BASE_CURRENCY
+    )
+
+
+class AdFilterForm(forms.Form):
+    """Rejects price bounds in a currency that cannot be converted"""
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('min_price') is not None or cleaned_data.get('max_price') is not None:
+            currency = price_bound_currency(cleaned_data)
+            if get_rate(currency) is None:
+                raise ValidationError({
+                    'price_currency': f'No exchange rate is set for {currency}; use another currency'
+                })
+        return cleaned_data
 
 
 class AdFilter(filters.FilterSet):
-    min_price = filters.NumberFilter(field_name='price', lookup_expr='gte')
-    max_price = filters.NumberFilter(field_name='price', lookup_expr='lte')
+    # Each matches one indexed Ad column; category, province and country
+    # are denormalized on write (see Ad.populate_derived_fields)
+    category = ReferenceFilter(model=Category)
+    subcategory = ReferenceFilter(model=SubCategory)
+    country = ReferenceFilter(model=Country)
+    province = ReferenceFilter(model=Province)
+    city = ReferenceFilter(model=City)
+    # Compared with Ad.price_normalized after converting from price_currency
+    # (default: the currency_code filter, else the base currency)
+    min_price = filters.NumberFilter(method='filter_price', lookup_expr='gte')
+    max_price = filters.NumberFilter(method='filter_price', lookup_expr='lte')
+    price_currency = filters.ChoiceFilter(
+        choices=[(code, code) for code, symbol in Ad.CURRENCY_CHOICES], method='filter_price_currency'
+    )
     created_after = filters.DateFilter(field_name='created_at', lookup_expr='gte')
     created_before = filters.DateFilter(field_name='created_at', lookup_expr='lte')
+    # Ads in cities within radius_km of a point (see filter_near)
+    near = PointFilter(method='filter_near')
+    radius_km = filters.NumberFilter(
+        method='filter_radius', min_value=0, max_value=settings.ADS_NEAR_MAX_RADIUS_KM
+    )
 
     class Meta:
         model = Ad
+        form = AdFilterForm
         fields = {
             'subcategory': ['exact'],
             'city': ['exact'],
             'ad_type': ['exact'],
             'currency_code': ['exact']
         }
+
+    def filter_near(self, queryset, name, value):
+        """Restrict to the cities within the radius and annotate each ad with
+        its city's ``distance`` in km, which ``?ordering=distance`` sorts by.
+
+        The candidate cities come from the registry's in-memory index, so the
+        database only sees an indexed ``city_id IN (...)``.
+        """
+        radius_km = self.form.cleaned_data.get('radius_km')
+        radius_km = float(radius_km) if radius_km is not None else settings.ADS_NEAR_DEFAULT_RADIUS_KM
+        distances = get_registry().city_index.within(*value, radius_km)
+        if not distances:
+            return queryset.none()
+        return queryset.filter(city_id__in=list(distances)).annotate(distance=city_distance(distances))
+
+    def filter_price(self, queryset, name, value):
+        # The currency has a rate (AdFilterForm.clean)
+        currency = price_bound_currency(self.form.cleaned_data)
+        lookup_expr = self.filters[name].lookup_expr
+        return exclude_unrated(queryset).filter(**{f'price_normalized__{lookup_expr}': normalize_price(value, currency)})
+
+    def filter_price_currency(self, queryset, name, value):
+        # Applied by filter_price
+        return queryset
+
+    def filter_radius(self, queryset, name, value):
+        # Applied by filter_near; on its own a radius filters nothing
+        return queryset
+
+
+# Query parameters that page, order or trim a listing without changing which ads match
+LISTING_CONTROL_PARAMS = {'limit', 'offset', 'cursor', 'ordering', 'format', 'fields', 'exclude'}
+
+
+def normalized_filter_key(prefix, request, ignore=()):
+    """Cache key for the filter/search part of a listing request.
+
+    Pagination and ordering parameters, those in ``ignore``, blank values
+    and parameter order are ignored, so equivalent requests share one
+    cache entry.
+    """
+    params = sorted(
+        (name, sorted(value.strip() for value in request.query_params.getlist(name) if value.strip()))
+        for name in request.query_params
+        if name not in LISTING_CONTROL_PARAMS and name not in ignore
+    )
+    params = [(name, values) for name, values in params if values]
+    digest = hashlib.md5(json.dumps(params).encode('utf-8')).hexdigest()
+    return f"{prefix}:{digest}"
@@ -0,0 +1,85 @@
+"""Distances between cities and search points.
+
+Ads are located by their city, so a proximity search is a search for the
+cities within the radius. ``CityProximityIndex`` keeps the cities that
+have coordinates sorted by latitude: a query bisects to the latitude band
+of the radius's bounding box, drops candidates outside its longitude range
+and computes the exact great-circle distance only for what is left. The
+cost depends on the number of cities near the point, not on the total.
+The index is built once per reference registry snapshot (see
+``ads.registry``).
+"""
+import math
+from bisect import bisect_left, bisect_right
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two WGS84 points, in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """``(min_lat, max_lat, lon_delta)`` enclosing the circle around a point.
+
+    ``lon_delta`` is None when the box reaches a pole, where every
+    longitude is in range.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = latitude - lat_delta, latitude + lat_delta
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90), min(max_lat, 90), None
+    # The circle is widest, in degrees of longitude, at its poleward edge
+    widest = max(abs(min_lat), abs(max_lat))
+    return min_lat, max_lat, lat_delta / math.cos(math.radians(widest))
+
+
+class CityProximityIndex:
+    """Cities with coordinates, sorted by latitude"""
+
+    def __init__(self, cities):
+        located = sorted(
+            (city.latitude, city.longitude, city.id)
+            for city in cities
+            if city.latitude is not None and city.longitude is not None
+        )
+        self.latitudes = [latitude for latitude, _, _ in located]
+        self.points = [(longitude, city_id) for _, longitude, city_id in located]
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def within(self, latitude, longitude, radius_km):
+        """``{city_id: distance_km}`` for every city within the radius"""
+        min_lat, max_lat, lon_delta = bounding_box(latitude, longitude, radius_km)
+        start = bisect_left(self.latitudes, min_lat)
+        end = bisect_right(self.latitudes, max_lat)
+
+        distances = {}
+        for index in range(start, end):
+            city_longitude, city_id = self.points[index]
+            # Longitude difference folded into [-180, 180) across the antimeridian
+            if lon_delta is not None and abs((city_longitude - longitude + 180) % 360 - 180) > lon_delta:
+                continue
+            distance = haversine_km(latitude, longitude, self.latitudes[index], city_longitude)
+            if distance <= radius_km:
+                distances[city_id] = distance
+        return distances
+
+    def in_box(self, south, west, north, east):
+        """IDs of the cities with ``south <= latitude < north`` and
+        ``west <= longitude < east``"""
+        start = bisect_left(self.latitudes, south)
+        end = bisect_left(self.latitudes, north)
+        return [
+            city_id for city_longitude, city_id in self.points[start:end]
+            if west <= city_longitude < east
+        ]
@@ -0,0 +1,96 @@
+"""Price distribution of a filtered ad listing, for the search page's price slider.
+
+One aggregate query over the filtered listing buckets its prices with
+``width_bucket``: ``linear`` buckets split the range between the lowest
+and highest price evenly; ``quantile`` buckets take their thresholds from
+``percentile_disc`` so each holds about the same number of ads, which
+keeps a few very expensive ads from squeezing everything else into the
+first bucket.
+"""
+from decimal import ROUND_CEILING, ROUND_FLOOR
+
+from django.db import connections
+
+from .currency import CENT
+
+
+def price_buckets(queryset, column, buckets, scale):
+    """``(low, high, thresholds, counts)`` for ``column`` of ``queryset``.
+
+    ``thresholds`` are the ``buckets - 1`` inner bucket edges and
+    ``counts`` maps a 0-based bucket index to its number of ads; it is
+    empty when nothing matches.
+    """
+    if queryset.query.is_empty():
+        return None, None, [], {}
+    sql, params = queryset.order_by().values(column).query.sql_with_params()
+
+    with connections[queryset.db].cursor() as cursor:
+        if scale == 'quantile':
+            # The listing is read once; the thresholds need all its prices sorted
+            cursor.execute(
+                f"WITH f AS MATERIALIZED (SELECT s.{column} AS price FROM ({sql}) s), "
+                f"e AS ("
+                f"  SELECT MIN(price) AS low, MAX(price) AS high, "
+                f"    percentile_disc(%s::float8[]) WITHIN GROUP (ORDER BY price) AS thresholds "
+                f"  FROM f"
+                f") "
+                f"SELECT e.low, e.high, e.thresholds, "
+                f"  width_bucket(f.price::float8, e.thresholds::float8[]) AS bucket, COUNT(*) "
+                f"FROM f, e GROUP BY e.low, e.high, e.thresholds, bucket",
+                [*params, [index / buckets for index in range(1, buckets)]]
+            )
+        else:
+            # MIN/MAX come from the price indexes where the filter allows and
+            # are read as scalar subqueries, so the pass that counts the
+            # buckets groups by the bucket alone. The highest price would
+            # fall in an extra bucket of its own, hence LEAST()
+            cursor.execute(
+                f"WITH e AS (SELECT MIN(s.{column}) AS low, MAX(s.{column}) AS high FROM ({sql}) s) "
+                f"SELECT (SELECT low FROM e), (SELECT high FROM e), NULL, "
+                f"  CASE WHEN (SELECT high = low FROM e) THEN 0 "
+                f"  ELSE LEAST(width_bucket(s.{column}::float8, "
+                f"    (SELECT low::float8 FROM e), (SELECT high::float8 FROM e), %s), %s) - 1 "
+                f"  END AS bucket, COUNT(*) "
+                f"FROM ({sql}) s GROUP BY bucket",
+                [*params, buckets, buckets, *params]
+            )
+        rows = cursor.fetchall()
+
+    if not rows:
+        return None, None, [], {}
+    low, high, thresholds = rows[0][:3]
+    if thresholds is None:
+        width = (high - low) / buckets
+        thresholds = [low + width * index for index in range(1, buckets)]
+    return low, high, list(thresholds), {bucket: count for _, _, _, bucket, count in rows}
+
+
+def build_price_histogram(queryset, column, currency, buckets, scale):
+    """Bucketed price counts with each bucket's bounds, in ``currency``"""
+    low, high, thresholds, counts = price_buckets(queryset, column, buckets, scale)
+    total = sum(counts.values())
+    if not total:
+        return {'currency': currency, 'scale': scale, 'total': 0, 'min': None, 'max': None, 'buckets': []}
+
+    if low == high:
+        # A single price: one bucket rather than many of zero width
+        thresholds, counts, buckets = [], {0: total}, 1
+    # Normalized prices carry sub-cent digits; show the range in whole cents
+    low, high = low.quantize(CENT, ROUND_FLOOR), high.quantize(CENT, ROUND_CEILING)
+    edges = [low, *thresholds, high]
+    return {
+        'currency': currency,
+        'scale': scale,
+        'total': total,
+        'min': str(low),
+        'max': str(high),
+        'buckets': [
+            {
+                'min': str(round(edges[index], 2)),
+                'max': str(round(edges[index + 1], 2)),
+                'count': counts.get(index, 0),
+            }
+            for index in range(buckets)
+        ],
+    }
@@ -0,0 +1,129 @@
+"""Resized/re-encoded variants of uploaded ad images.
+
+``render_variants`` is pure CPU work on bytes, so it can run in a Celery
+worker or a ``ProcessPoolExecutor`` (see the ``backfill_media_variants``
+command). ``save_variants`` writes the results under names that include a
+hash of their content, so every variant URL is immutable (see
+``ads.serving``), and records them on ``AdMedia.variants``; running it
+again for the same media replaces the previous files.
+"""
+import hashlib
+import io
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .media import MEDIA_ROOT_DIR, delete_stored
+from .models import Ad, AdMedia
+
+logger = logging.getLogger(__name__)
+
+
+FORMAT_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'WEBP': 'webp',
+}
+
+
+def render_variants(data, specs):
+    """Return ``{name: (bytes, width, height)}`` for each variant spec.
+
+    Images are auto-rotated from EXIF and only ever scaled down,
+    preserving aspect ratio to fit within ``spec['size']``.
+    """
+    rendered = {}
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        for name, spec in specs.items():
+            variant = image.copy()
+            variant.thumbnail(spec['size'], Image.Resampling.LANCZOS)
+            if spec['format'] == 'JPEG' and variant.mode not in ('RGB', 'L'):
+                variant = variant.convert('RGB')
+            buffer = io.BytesIO()
+            variant.save(buffer, spec['format'], quality=spec.get('quality', 80))
+            rendered[name] = (buffer.getvalue(), variant.width, variant.height)
+    return rendered
+
+
+def variant_path(media, name, data):
+    extension = FORMAT_EXTENSIONS[settings.ADS_MEDIA_VARIANTS[name]['format']]
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    return f"{MEDIA_ROOT_DIR}/{media.ad_id}/variants/{media.id}-{name}-{digest}.{extension}"
+
+
+def needs_variants(media):
+    return media.media_type == 'image' and not set(settings.ADS_MEDIA_VARIANTS) <= set(media.variants)
+
+
+def load_source(media):
+    """Bytes of the original upload"""
+    path = media.file_path or media.file_url[len(settings.MEDIA_URL):]
+    with default_storage.open(path, 'rb') as source:
+        return source.read()
+
+
+def save_variants(media, rendered):
+    """Store rendered variants, record them on ``media`` and point the ad's
+    thumbnail at the thumbnail variant if it showed this original"""
+    previous = media.variants or {}
+    variants = {}
+    for name, (data, width, height) in rendered.items():
+        path = variant_path(media, name, data)
+        # Identical output from an earlier run is already stored under this name
+        if not default_storage.exists(path):
+            path = default_storage.save(path, ContentFile(data))
+        variants[name] = {
+            'path': path,
+            'url': default_storage.url(path),
+            'width': width,
+            'height': height,
+        }
+
+    thumbnail_variant = settings.ADS_MEDIA_THUMBNAIL_VARIANT
+    with transaction.atomic():
+        AdMedia.objects.filter(id=media.id).update(variants=variants)
+        if thumbnail_variant in variants:
+            shown = [media.file_url]
+            if thumbnail_variant in previous:
+                shown.append(previous[thumbnail_variant]['url'])
+            Ad.objects.filter(id=media.ad_id, thumbnail__in=shown).update(
+                thumbnail=variants[thumbnail_variant]['url'],
+                updated_at=timezone.now()
+            )
+    media.variants = variants
+
+    current = {variant['path'] for variant in variants.values()}
+    delete_stored([
+        variant['path'] for variant in previous.values() if variant['path'] not in current
+    ])
+    return variants
+
+
+def process_media(media_id, force=False):
+    """Generate and record all configured variants for one AdMedia; idempotent"""
+    media = AdMedia.objects.filter(id=media_id).first()
+    if media is None or not (force or needs_variants(media)):
+        return False
+    rendered = render_variants(load_source(media), settings.ADS_MEDIA_VARIANTS)
+    save_variants(media, rendered)
+    logger.info(f"Generated {len(rendered)} variants for ad media {media.id}")
+    return True
+
+
+def schedule_variants(media_ids):
+    """Queue variant generation for freshly uploaded media"""
+    from .tasks import generate_media_variants
+
+    for index, media_id in enumerate(media_ids):
+        try:
+            generate_media_variants.delay(media_id)
+        except Exception as e:
+            # Broker unavailable: don't retry for each file. The media are
+            # picked up later by backfill_media_variants
+            logger.warning(f"Could not queue variants for ad media {media_ids[index:]}: {str(e)}")
+            return
@@ -0,0 +1,76 @@
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from ads.images import load_source, needs_variants, render_variants, save_variants
+from ads.models import AdMedia
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate missing image variants for existing ad media. Decoding and "
+        "resizing run in worker processes; storage and database writes stay "
+        "in this process"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+        parser.add_argument('--batch-size', type=int, default=500, help="Media rows read per query")
+        parser.add_argument('--force', action='store_true', help="Regenerate variants that already exist")
+
+    def handle(self, *args, **options):
+        specs = settings.ADS_MEDIA_VARIANTS
+        # Bound memory: never more source images in flight than this
+        max_in_flight = options['workers'] * 2
+        # Workers only render bytes and never touch the DB, but must not
+        # inherit an open connection
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+
+        done = failed = 0
+        pending = {}
+        with ProcessPoolExecutor(max_workers=options['workers'], mp_context=context) as executor:
+            for media in self.iter_media(options['batch_size'], options['force']):
+                try:
+                    data = load_source(media)
+                except (FileNotFoundError, OSError) as e:
+                    failed += 1
+                    self.stderr.write(f"media {media.id}: cannot read original: {e}")
+                    continue
+                pending[executor.submit(render_variants, data, specs)] = media
+                if len(pending) >= max_in_flight:
+                    completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    done, failed = self.collect(completed, pending, done, failed)
+            while pending:
+                completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                done, failed = self.collect(completed, pending, done, failed)
+
+        self.stdout.write(self.style.SUCCESS(f"Generated variants for {done} media ({failed} failed)"))
+
+    def iter_media(self, batch_size, force):
+        """Image media in id order, keyset-paginated so the scan never holds a cursor open"""
+        last_id = 0
+        while True:
+            batch = list(
+                AdMedia.objects.filter(media_type='image', id__gt=last_id).order_by('id')[:batch_size]
+            )
+            if not batch:
+                return
+            last_id = batch[-1].id
+            for media in batch:
+                if force or needs_variants(media):
+                    yield media
+
+    def collect(self, completed, pending, done, failed):
+        for future in completed:
+            media = pending.pop(future)
+            try:
+                save_variants(media, future.result())
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"media {media.id}: {e}")
+        return done, failed
@@ -0,0 +1,145 @@
+import functools
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from ads import api_views
+from ads.api_views import AdViewSet
+from ads.benchmarks import ensure_reference_data, get_seed_author, summarize, format_summary
+from ads.media import media_path
+from ads.models import Ad, MediaBlob
+
+
+DEFAULT_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+
+def serial_in_memory_store(ad, files):
+    """upload_media's original write path: a full in-memory copy per file, one
+    after another, each under a new per-ad name. Stands in for
+    ``store_uploads`` with ``ad`` bound."""
+    return [
+        MediaBlob(path=default_storage.save(media_path(ad, file), ContentFile(file.read())))
+        for file in files
+    ]
+
+
+def reset_peak_rss():
+    # Linux: writing 5 resets VmHWM, which otherwise starts at the parent's peak
+    with open('/proc/self/clear_refs', 'w') as clear_refs:
+        clear_refs.write('5')
+
+
+def rss_kb(field):
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1])
+    return 0
+
+
+def run_uploads(queue, ad_id, user, body, repeat, store, setting_overrides):
+    """Child process: time ``repeat`` upload requests and report the largest
+    RSS growth seen while the view handled one of them"""
+    # Variants are rendered by Celery, outside the request being measured
+    api_views.schedule_variants = lambda media_ids: None
+    if store is not None:
+        api_views.store_uploads = store
+    with override_settings(**setting_overrides):
+        view = AdViewSet.as_view({'post': 'upload_media'})
+        factory = APIRequestFactory()
+        samples = []
+        peak_kb = 0
+        for _ in range(repeat):
+            request = factory.generic(
+                'POST', f'/api/v1/ads/ads/{ad_id}/upload-media/', body,
+                content_type=MULTIPART_CONTENT
+            )
+            force_authenticate(request, user=user)
+            reset_peak_rss()
+            baseline = rss_kb('VmRSS')
+            started = time.perf_counter()
+            response = view(request, pk=ad_id)
+            samples.append((time.perf_counter() - started) * 1000)
+            peak_kb = max(peak_kb, rss_kb('VmHWM') - baseline)
+            # What the WSGI handler does once the response is sent
+            request.close()
+            if response.status_code != 200:
+                queue.put(RuntimeError(f"Upload failed: {response.status_code} {response.data}"))
+                return
+        queue.put((samples, peak_kb))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare request latency and peak RSS of upload_media for the original "
+        "serial in-memory writes and the streaming, content-addressed writes, "
+        "where repeated requests re-upload stored content (Linux only)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=10, help="Files per request")
+        parser.add_argument('--size-mb', type=float, default=5, help="Size of each file in MB")
+        parser.add_argument('--repeat', type=int, default=5, help="Requests per mode")
+
+    def handle(self, *args, **options):
+        size = int(options['size_mb'] * 1024 * 1024)
+        payloads = [os.urandom(size) for _ in range(options['files'])]
+        digests = [hashlib.sha256(payload).hexdigest() for payload in payloads]
+        body = encode_multipart(BOUNDARY, {
+            'files': [SimpleUploadedFile(f'photo{i}.jpg', payload) for i, payload in enumerate(payloads)]
+        })
+        del payloads
+
+        subcategory_ids, cities = ensure_reference_data()
+        city_id, province_id, country_id = cities[0]
+        author = get_seed_author()
+        ad = Ad.objects.create(
+            title='Media upload benchmark', description='Synthetic ad used by bench_media_upload',
+            price=1, subcategory_id=subcategory_ids[0], country_id=country_id,
+            province_id=province_id, city_id=city_id, contact_visibility='public', author=author
+        )
+
+        modes = (
+            # Before: files up to 5MB were kept in memory by the upload handler
+            ('serial in-memory', functools.partial(serial_in_memory_store, ad),
+             {'FILE_UPLOAD_MAX_MEMORY_SIZE': 5 * 1024 * 1024, 'FILE_UPLOAD_HANDLERS': DEFAULT_UPLOAD_HANDLERS}),
+            # Only the first request writes; the rest are duplicate uploads
+            ('content-addressed', None, {}),
+        )
+        context = multiprocessing.get_context('fork')
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+                for label, store, setting_overrides in modes:
+                    # Forked children must not share the parent's DB connection
+                    connections.close_all()
+                    queue = context.Queue()
+                    process = context.Process(target=run_uploads, args=(
+                        queue, ad.id, author, body, options['repeat'], store, setting_overrides
+                    ))
+                    process.start()
+                    result = queue.get()
+                    process.join()
+                    if isinstance(result, Exception):
+                        raise result
+                    samples, peak_kb = result
+                    self.stdout.write(
+                        f"{format_summary(label, summarize(samples))} "
+                        f"peak RSS +{peak_kb / 1024:.1f}MiB"
+                    )
+        finally:
+            ad.delete()
+            MediaBlob.objects.filter(sha256__in=digests).delete()
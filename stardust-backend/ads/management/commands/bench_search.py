@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from ads.api_views import AdViewSet
+from ads.benchmarks import VOCABULARY, seed_ads, time_call, summarize, format_summary
+from ads.models import Ad
+
+
+# Mix of very common, mid-frequency and rare vocabulary terms plus a phrase.
+DEFAULT_TERMS = [VOCABULARY[0], VOCABULARY[5], VOCABULARY[40], VOCABULARY[-1], 'leather sofa']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare p50/p95 latency of the legacy ILIKE search with the full-text "
+        "search backend on the public ad listing (count + first page)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--active', type=int, default=0,
+            help="Seed ads until at least this many active ads exist (e.g. 1000000)"
+        )
+        parser.add_argument('--repeat', type=int, default=20, help="Runs per search term")
+        parser.add_argument('--term', action='append', dest='terms', help="Search term (repeatable)")
+
+    def handle(self, *args, **options):
+        active = Ad.objects.filter(status='active').count()
+        if active < options['active']:
+            # Seeded data is ~90% active
+            missing = int((options['active'] - active) / 0.9) + 1
+            self.stdout.write(f"Seeding {missing} ads...")
+            seed_ads(missing, stdout=self.stdout)
+            active = Ad.objects.filter(status='active').count()
+
+        self.stdout.write(f"Active ads: {active}")
+        terms = options['terms'] or DEFAULT_TERMS
+
+        legacy_backends = {
+            'filter_backends': [DjangoFilterBackend, SearchFilter, OrderingFilter],
+            'search_fields': ['title', 'description'],
+        }
+        results = {'ilike': [], 'fulltext': []}
+        for term in terms:
+            for label, overrides in (('ilike', legacy_backends), ('fulltext', {})):
+                samples = time_call(
+                    lambda: self.list_page(term, overrides),
+                    options['repeat']
+                )
+                results[label].extend(samples)
+                self.stdout.write(format_summary(f"{label} {term!r}", summarize(samples)))
+
+        self.stdout.write('')
+        for label, samples in results.items():
+            self.stdout.write(format_summary(f"{label} (all terms)", summarize(samples)))
+
+    def list_page(self, term, overrides, limit=20):
+        """Run the same queries CustomPagination issues for the first page"""
+        request = Request(APIRequestFactory().get('/api/v1/ads/ads/', {'search': term}))
+        view = AdViewSet(request=request, action='list', format_kwarg=None, **overrides)
+        queryset = view.filter_queryset(view.get_queryset())
+        queryset.count()
+        return list(queryset[:limit])
@@ -0,0 +1,64 @@
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from ads.benchmarks import seed_ads, time_call, summarize, format_summary
+from ads.models import Ad
+from ads.serializers import AdSummarySerializer, AdSummaryProjection
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput and peak memory of AdSummarySerializer over full "
+        "model instances with the AdSummaryProjection fast path (fetch + serialize)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help="Insert synthetic ads first until the table holds at least this many rows"
+        )
+        parser.add_argument('--repeat', type=int, default=50, help="Pages per measurement")
+        parser.add_argument(
+            '--page-size', type=int, action='append', dest='page_sizes',
+            help="Page size (repeatable, default 20 and 100)"
+        )
+
+    def handle(self, *args, **options):
+        existing = Ad.objects.count()
+        if existing < options['seed']:
+            seed_ads(options['seed'] - existing, stdout=self.stdout)
+
+        base = Ad.objects.filter(status='active').order_by('-created_at', '-id')
+        for page_size in options['page_sizes'] or [20, 100]:
+            for label, render in (
+                ('serializer', lambda size=page_size: self.serializer_page(base, size)),
+                ('projection', lambda size=page_size: self.projection_page(base, size)),
+            ):
+                render()  # warm up
+                samples = time_call(render, options['repeat'])
+                summary = summarize(samples)
+                rows_per_second = page_size / (summary['mean'] / 1000)
+                self.stdout.write(
+                    f"{format_summary(f'{label} limit={page_size}', summary)} "
+                    f"rows/s={rows_per_second:10.0f} peak={self.peak_memory(render) / 1024:8.1f}KiB"
+                )
+
+    def serializer_page(self, queryset, limit):
+        """The list path as it was: full instances over five joins plus media"""
+        page = list(queryset.select_related(
+            'subcategory__category', 'country', 'province', 'city', 'author'
+        ).prefetch_related('media')[:limit])
+        return AdSummarySerializer(page, many=True).data
+
+    def projection_page(self, queryset, limit):
+        projection = AdSummaryProjection()
+        return projection.serialize(projection.project(queryset)[:limit])
+
+    def peak_memory(self, render):
+        tracemalloc.start()
+        try:
+            render()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
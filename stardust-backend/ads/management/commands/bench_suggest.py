@@ -0,0 +1,119 @@
+import queue
+import random
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIRequestFactory
+
+from ads.api_views import AdViewSet
+from ads.benchmarks import VOCABULARY, VOCABULARY_WEIGHTS, summarize, format_summary
+from ads.suggest import POPULAR_KEY, get_popular_completions, refresh_popular_completions
+
+
+def typed_prefixes(rng, max_length):
+    """Endless search box prefixes: the first 1..max_length characters of
+    vocabulary words, common words typed more often"""
+    while True:
+        word = rng.choices(VOCABULARY, VOCABULARY_WEIGHTS)[0]
+        yield word[:rng.randint(1, max_length)]
+
+
+def serve(view, jobs, results):
+    """Worker thread: answer scheduled requests, timing each from when it
+    was due so queueing behind slow requests counts as latency"""
+    factory = APIRequestFactory()
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            due, prefix, remote_addr, limit = job
+            request = factory.get(
+                '/api/v1/ads/ads/suggest/', {'q': prefix, 'limit': limit}, REMOTE_ADDR=remote_addr
+            )
+            response = view(request)
+            results.append((prefix, (time.perf_counter() - due) * 1000, response.status_code))
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the typeahead suggestions endpoint: short prefixes sent at a "
+        "fixed rate (open loop) from many simulated users, reporting latency by "
+        "prefix length"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rate', type=float, default=200, help="Requests per second")
+        parser.add_argument('--duration', type=float, default=30, help="Seconds to send requests for")
+        parser.add_argument('--workers', type=int, default=16, help="Threads serving requests")
+        parser.add_argument(
+            '--users', type=int, default=100,
+            help="Simulated users (client IPs), each subject to the suggest rate limit; "
+                 "the default types about 2 keystrokes a second each at 200 req/s"
+        )
+        parser.add_argument('--max-length', type=int, default=4, help="Longest prefix typed")
+        parser.add_argument('--limit', type=int, default=8, help="Suggestions per request")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help="Clear the cache first and report only each prefix's first request, "
+                 "which queries the database when the popular completions fall short"
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if options['cold']:
+            cache.clear()
+        # Counted by Celery beat in production; not part of the measurement
+        if cache.get(POPULAR_KEY) is None:
+            refresh_popular_completions()
+        self.stdout.write(f"Popular completions: {len(get_popular_completions())}")
+
+        view = AdViewSet.as_view({'get': 'suggest'})
+        jobs = queue.Queue()
+        results = []
+        workers = [
+            threading.Thread(target=serve, args=(view, jobs, results), daemon=True)
+            for _ in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        prefixes = typed_prefixes(rng, options['max_length'])
+        total = int(options['rate'] * options['duration'])
+        interval = 1 / options['rate']
+        started = time.perf_counter()
+        for index in range(total):
+            due = started + index * interval
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            user = rng.randrange(options['users'])
+            jobs.put((due, next(prefixes), f"10.{user >> 16 & 255}.{user >> 8 & 255}.{user & 255}", options['limit']))
+        for _ in workers:
+            jobs.put(None)
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        failed = [status_code for _, _, status_code in results if status_code != 200]
+        self.stdout.write(
+            f"Served {total} requests in {elapsed:.1f}s ({total / elapsed:.0f} req/s), "
+            f"{len(failed)} not OK {sorted(set(failed)) or ''}"
+        )
+        if options['cold']:
+            first = {}
+            for result in results:
+                first.setdefault(result[0], result)
+            results = list(first.values())
+            self.stdout.write(f"First requests for {len(results)} distinct prefixes:")
+        for length in range(1, options['max_length'] + 1):
+            samples = [latency for prefix, latency, _ in results if len(prefix) == length]
+            if samples:
+                self.stdout.write(format_summary(f"{length}-character prefix", summarize(samples)))
+        self.stdout.write(format_summary('all prefixes', summarize([latency for _, latency, _ in results])))
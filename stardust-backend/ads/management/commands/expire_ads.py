@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ads.models import Ad
+from ads.services import AdLifecycleService
+
+
+class Command(BaseCommand):
+    help = "Mark active ads whose expires_at has passed as expired, in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.ADS_EXPIRY_BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, default=None, help="Stop after this many batches")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many ads are overdue")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            overdue = Ad.objects.filter(status='active', expires_at__lte=timezone.now()).count()
+            self.stdout.write(f"{overdue} active ads are past their expiry date")
+            return
+
+        expired = AdLifecycleService.expire_overdue(
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches']
+        )
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} ads"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from ads.counters import flush_view_counts
+
+
+class Command(BaseCommand):
+    help = "Write buffered ad view counts to the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = flush_view_counts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Updated view counts for {updated} ads"))
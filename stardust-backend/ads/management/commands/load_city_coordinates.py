@@ -0,0 +1,80 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ads.models import Country, Province, City
+from ads.registry import bump_reference_version
+
+
+class Command(BaseCommand):
+    help = (
+        "Load city coordinates from a CSV file with the columns country, "
+        "province, city, latitude, longitude. Countries match by code or name, "
+        "provinces and cities by name (case-insensitive)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with a header row")
+        parser.add_argument('--create', action='store_true', help="Create provinces and cities that don't exist yet")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows written per query")
+
+    def handle(self, *args, **options):
+        countries = {}
+        for country in Country.objects.all():
+            countries[country.code.lower()] = country
+            countries[country.name.lower()] = country
+        provinces = {
+            (province.country_id, province.name.lower()): province
+            for province in Province.objects.all()
+        }
+        cities = {
+            (city.province_id, city.name.lower()): city
+            for city in City.objects.all()
+        }
+
+        updated, created, skipped = {}, [], 0
+        with open(options['path'], newline='', encoding='utf-8') as source:
+            for line, row in enumerate(csv.DictReader(source), start=2):
+                try:
+                    name = row['city'].strip()
+                    latitude, longitude = float(row['latitude']), float(row['longitude'])
+                    country = countries.get(row['country'].strip().lower())
+                    province_name = row['province'].strip()
+                except (KeyError, AttributeError, TypeError, ValueError) as e:
+                    raise CommandError(f"line {line}: {e}")
+                if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                    raise CommandError(f"line {line}: coordinates out of range")
+                if country is None:
+                    skipped += 1
+                    continue
+
+                province = provinces.get((country.id, province_name.lower()))
+                if province is None:
+                    if not options['create']:
+                        skipped += 1
+                        continue
+                    province = Province.objects.create(country=country, name=province_name)
+                    provinces[(country.id, province_name.lower())] = province
+
+                city = cities.get((province.id, name.lower()))
+                if city is None:
+                    if not options['create']:
+                        skipped += 1
+                        continue
+                    city = City(province=province, name=name)
+                    cities[(province.id, name.lower())] = city
+                    created.append(city)
+                city.latitude, city.longitude = latitude, longitude
+                if city.pk is not None:
+                    updated[city.pk] = city
+
+        with transaction.atomic():
+            City.objects.bulk_update(updated.values(), ['latitude', 'longitude'], batch_size=options['batch_size'])
+            City.objects.bulk_create(created, batch_size=options['batch_size'])
+        # Bulk writes send no signals
+        bump_reference_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {len(updated)} cities, created {len(created)} ({skipped} rows skipped)"
+        ))
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ads.media import collect_blobs, reconcile_orphans
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete unreferenced media blobs, and files under ads/<id>/ in storage "
+        "that no ad or media row refers to"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=settings.ADS_MEDIA_ORPHAN_MIN_AGE,
+            help="Ignore files modified less than this many seconds ago"
+        )
+        parser.add_argument('--dry-run', action='store_true', help="List orphans without deleting them")
+
+    def handle(self, *args, **options):
+        orphans = collect_blobs(min_age=options['min_age'], dry_run=options['dry_run'])
+        orphans += reconcile_orphans(min_age=options['min_age'], dry_run=options['dry_run'])
+        for path in orphans:
+            self.stdout.write(path)
+        verb = "Found" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(orphans)} orphaned media files"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from ads.benchmarks import seed_ads
+
+
+class Command(BaseCommand):
+    help = "Insert synthetic ads for load testing and benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int, help="Number of ads to insert")
+        parser.add_argument('--batch-size', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=None, help="Random seed for reproducible data")
+
+    def handle(self, *args, **options):
+        written = seed_ads(
+            options['count'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            stdout=self.stdout
+        )
+        self.stdout.write(self.style.SUCCESS(f"Inserted {written} ads"))
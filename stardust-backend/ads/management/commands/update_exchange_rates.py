@@ -0,0 +1,51 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ads.models import ExchangeRate
+from ads.registry import bump_reference_version
+from ads.services import PriceService
+
+
+class Command(BaseCommand):
+    help = (
+        "Set exchange rates (CODE=RATE, the value of one unit in the base "
+        "currency) and recompute the normalized price of the affected ads"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('rates', nargs='*', help="e.g. ZAR=0.055 MWK=0.00058")
+        parser.add_argument('--all', action='store_true', help="Recompute normalized prices for every currency")
+        parser.add_argument('--batch-size', type=int, default=settings.ADS_PRICE_RENORMALIZE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        rates = {}
+        for pair in options['rates']:
+            code, _, value = pair.partition('=')
+            try:
+                rate = Decimal(value)
+            except InvalidOperation:
+                raise CommandError(f"Invalid rate: {pair}")
+            if len(code) != 3 or not rate.is_finite() or rate <= 0:
+                raise CommandError(f"Invalid rate: {pair}")
+            rates[code.upper()] = rate
+        if not rates and not options['all']:
+            raise CommandError("Give at least one CODE=RATE, or --all")
+
+        if rates:
+            # Bulk upsert: no per-row signals, the recompute below runs here
+            with transaction.atomic():
+                ExchangeRate.objects.bulk_create(
+                    [ExchangeRate(currency_code=code, rate=rate) for code, rate in rates.items()],
+                    update_conflicts=True,
+                    unique_fields=['currency_code'],
+                    update_fields=['rate', 'updated_at'],
+                )
+            bump_reference_version()
+
+        updated = PriceService.renormalize(
+            None if options['all'] else list(rates), batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f"Updated {len(rates)} rates; {updated} ad prices recomputed"))
@@ -0,0 +1,337 @@
+"""Writing uploaded ad media to storage.
+
+Uploads are content-addressed: each file is stored once per distinct
+content under ``ads/blobs/``, keyed by its SHA-256, and recorded as a
+``MediaBlob`` that any number of ``AdMedia`` rows share. The hash is
+computed by the upload handlers while the request body streams in, so a
+re-uploaded photo costs no extra read and no storage write.
+
+New content is handed to ``Storage.save`` as-is: the storage reads it with
+``File.chunks()`` (or moves the temporary file, for uploads spooled to
+disk), so no extra in-memory copy of the file is made. Files of one request
+are written concurrently on a process-wide, bounded thread pool.
+
+Storage writes happen before, not inside, the database transaction that
+records the media rows. Blobs no row refers to are removed by
+``collect_blobs`` once unused for ``ADS_MEDIA_ORPHAN_MIN_AGE``; files left
+in the per-ad directories used before blobs existed are removed by
+``reconcile_orphans``.
+"""
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+# Storage directory holding one ``<ad id>/`` folder per ad
+MEDIA_ROOT_DIR = 'ads'
+# Content-addressed files, ``ads/blobs/<ab>/<cd>/<sha256><ext>``
+BLOB_DIR = f'{MEDIA_ROOT_DIR}/blobs'
+# Postgres advisory lock: shared by uploads registering blobs, held
+# exclusively by ``collect_blobs`` while it removes files
+BLOB_LOCK_ID = 7340521
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_upload_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.ADS_MEDIA_UPLOAD_WORKERS,
+                    thread_name_prefix='ad-media'
+                )
+    return _executor
+
+
+class HashingUploadMixin:
+    """Compute the SHA-256 of each uploaded file as its chunks arrive and
+    expose it as ``file.sha256``"""
+
+    def new_file(self, *args, **kwargs):
+        # Set first: MemoryFileUploadHandler.new_file raises StopFutureHandlers
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        remaining = super().receive_data_chunk(raw_data, start)
+        if remaining is None:
+            # This handler consumed the chunk
+            self.sha256.update(raw_data)
+        return remaining
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def content_hash(file):
+    """SHA-256 of ``file``; computed by the upload handler when possible"""
+    digest = getattr(file, 'sha256', None)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        for chunk in file.chunks():
+            sha256.update(chunk)
+        file.seek(0)
+        digest = file.sha256 = sha256.hexdigest()
+    return digest
+
+
+def validate_upload(file):
+    """Return ``(error, message, status_code)`` for an unacceptable file, else None"""
+    if file.size > settings.MAX_IMAGE_SIZE:
+        return (
+            "file_too_large",
+            f"File size exceeds {settings.MAX_IMAGE_SIZE // (1024 * 1024)}MB limit",
+            413
+        )
+    if os.path.splitext(file.name)[1].lower() not in settings.ALLOWED_IMAGE_EXTENSIONS:
+        return (
+            "invalid_file_type",
+            f"Only {', '.join(settings.ALLOWED_IMAGE_EXTENSIONS)} files are allowed",
+            400
+        )
+    return None
+
+
+def media_path(ad, file):
+    """Per-ad storage path, as used before content-addressed storage"""
+    return f"{MEDIA_ROOT_DIR}/{ad.id}/{uuid.uuid4()}{os.path.splitext(file.name)[1].lower()}"
+
+
+def blob_path(digest, file):
+    return f"{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{os.path.splitext(file.name)[1].lower()}"
+
+
+def register_blobs(files_by_digest):
+    """Upsert a ``MediaBlob`` per digest and mark each as just used.
+
+    Returns ``{digest: (blob, created)}``. Touching ``last_used_at`` keeps
+    ``collect_blobs`` away from blobs an upload is about to reference; a
+    blob it is deleting right now blocks the upsert until the delete
+    commits, after which the row is created afresh. The shared blob lock
+    keeps the upsert from landing while the collector removes files.
+    """
+    from .models import MediaBlob
+
+    table = MediaBlob._meta.db_table
+    now = timezone.now()
+    rows = []
+    params = []
+    for digest, file in files_by_digest.items():
+        rows.append("(%s, %s, %s, 0, %s, %s)")
+        params.extend([digest, blob_path(digest, file), file.size, now, now])
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock_shared(%s)", [BLOB_LOCK_ID])
+        cursor.execute(
+            f"INSERT INTO {table} (sha256, path, size, ref_count, created_at, last_used_at) "
+            f"VALUES {', '.join(rows)} "
+            f"ON CONFLICT (sha256) DO UPDATE SET last_used_at = EXCLUDED.last_used_at "
+            # xmax is 0 only for freshly inserted rows
+            f"RETURNING id, sha256, path, size, (xmax = 0)",
+            params
+        )
+        return {
+            digest: (MediaBlob(id=blob_id, sha256=digest, path=path, size=size), created)
+            for blob_id, digest, path, size, created in cursor.fetchall()
+        }
+
+
+def write_blob(path, file):
+    saved_path = default_storage.save(path, file)
+    if saved_path != path:
+        # A concurrent upload of the same content got there first
+        default_storage.delete(saved_path)
+    return path
+
+
+def store_uploads(files):
+    """Store ``files`` by content; return their ``MediaBlob`` rows in order.
+
+    Only content not already in storage is written (once per request,
+    concurrently). If a write fails the first error is raised; blobs it
+    left without references are collected later by ``collect_blobs``.
+    """
+    files_by_digest = {}
+    for file in files:
+        files_by_digest.setdefault(content_hash(file), file)
+    blobs = register_blobs(files_by_digest)
+
+    # Existing blobs are re-written only if their file went missing
+    pending = {
+        digest: blob for digest, (blob, created) in blobs.items()
+        if created or not default_storage.exists(blob.path)
+    }
+    executor = get_upload_executor()
+    futures = [
+        executor.submit(write_blob, blob.path, files_by_digest[digest])
+        for digest, blob in pending.items()
+    ]
+    wait(futures)
+
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        raise errors[0]
+    logger.debug(f"Stored {len(pending)} new of {len(files)} uploaded files")
+    return [blobs[content_hash(file)][0] for file in files]
+
+
+def delete_stored(paths):
+    """Best-effort removal of files whose database rows were never written"""
+    for path in paths:
+        try:
+            default_storage.delete(path)
+        except Exception as e:
+            logger.warning(f"Could not delete stored media {path}: {str(e)}")
+
+
+def iter_ad_directories():
+    """Yield ``(ad_id, [file paths])`` for every ``ads/<id>/`` directory in
+    storage, including its ``variants/`` subdirectory"""
+    try:
+        directories, _ = default_storage.listdir(MEDIA_ROOT_DIR)
+    except FileNotFoundError:
+        return
+    for directory in directories:
+        if not directory.isdigit():
+            continue
+        base = f"{MEDIA_ROOT_DIR}/{directory}"
+        subdirectories, files = default_storage.listdir(base)
+        paths = [f"{base}/{name}" for name in files]
+        if 'variants' in subdirectories:
+            _, variant_files = default_storage.listdir(f"{base}/variants")
+            paths.extend(f"{base}/variants/{name}" for name in variant_files)
+        yield int(directory), paths
+
+
+def find_orphans(ad_paths, min_age):
+    """Paths in ``{ad_id: [paths]}`` not referenced by any ad or media row
+    (originals, their variants, or the ad thumbnail).
+
+    Files younger than ``min_age`` are never reported: they may belong to
+    an upload whose rows are about to be committed.
+    """
+    from .models import Ad, AdMedia
+
+    ad_ids = list(ad_paths)
+    existing = {
+        ad_id: thumbnail
+        for ad_id, thumbnail in Ad.objects.filter(id__in=ad_ids).values_list('id', 'thumbnail')
+    }
+    referenced_paths = set()
+    referenced_urls = {thumbnail for thumbnail in existing.values() if thumbnail}
+    media_rows = AdMedia.objects.filter(ad_id__in=existing).values_list('file_path', 'file_url', 'variants')
+    for file_path, file_url, variants in media_rows:
+        if file_path:
+            referenced_paths.add(file_path)
+        referenced_urls.add(file_url)
+        referenced_paths.update(variant['path'] for variant in variants.values())
+
+    cutoff = timezone.now() - timezone.timedelta(seconds=min_age)
+    orphans = []
+    for ad_id, paths in ad_paths.items():
+        for path in paths:
+            if path in referenced_paths or default_storage.url(path) in referenced_urls:
+                continue
+            if default_storage.get_modified_time(path) > cutoff:
+                continue
+            orphans.append(path)
+    return orphans
+
+
+def reconcile_orphans(min_age=None, batch_size=500, dry_run=False):
+    """Delete stored ad media that no database row points at; return the paths"""
+    min_age = settings.ADS_MEDIA_ORPHAN_MIN_AGE if min_age is None else min_age
+    orphans = []
+    batch = {}
+    for ad_id, paths in iter_ad_directories():
+        if paths:
+            batch[ad_id] = paths
+        if len(batch) >= batch_size:
+            orphans.extend(find_orphans(batch, min_age))
+            batch = {}
+    if batch:
+        orphans.extend(find_orphans(batch, min_age))
+
+    if not dry_run:
+        delete_stored(orphans)
+    logger.info(f"Media reconciliation: {len(orphans)} orphaned files{' found' if dry_run else ' deleted'}")
+    return orphans
+
+
+def delete_collected(paths):
+    """Remove the files of collected blobs, unless an upload re-created them.
+
+    Runs after the collecting transaction commits. Holding the blob lock
+    exclusively, files whose path has a blob row again are left alone; an
+    upload registering after the lock is released writes its file anew.
+    """
+    from .models import MediaBlob
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [BLOB_LOCK_ID])
+        reused = set(MediaBlob.objects.filter(path__in=paths).values_list('path', flat=True))
+        delete_stored([path for path in paths if path not in reused])
+
+
+def collect_blobs(min_age=None, batch_size=500, dry_run=False):
+    """Delete blobs no media row has used for ``min_age`` seconds; return their paths.
+
+    Each batch deletes its rows in one transaction and their files once it
+    commits, so a failed commit never leaves rows without files. Rows are
+    claimed with ``SKIP LOCKED`` and re-checked against ``last_used_at``,
+    so a blob an upload is reusing concurrently is never removed.
+    """
+    from .models import MediaBlob
+
+    min_age = settings.ADS_MEDIA_ORPHAN_MIN_AGE if min_age is None else min_age
+    cutoff = timezone.now() - timezone.timedelta(seconds=min_age)
+    if dry_run:
+        paths = list(
+            MediaBlob.objects.filter(ref_count=0, last_used_at__lt=cutoff).values_list('path', flat=True)
+        )
+        logger.info(f"Media blob collection: {len(paths)} unreferenced blobs found")
+        return paths
+
+    table = MediaBlob._meta.db_table
+    paths = []
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE id IN ("
+                f"  SELECT id FROM {table} WHERE ref_count = 0 AND last_used_at < %s"
+                f"  LIMIT %s FOR UPDATE SKIP LOCKED"
+                f") RETURNING path",
+                [cutoff, batch_size]
+            )
+            batch = [row[0] for row in cursor.fetchall()]
+            if batch:
+                transaction.on_commit(lambda batch=batch: delete_collected(batch))
+        paths.extend(batch)
+        if len(batch) < batch_size:
+            break
+    logger.info(f"Media blob collection: {len(paths)} unreferenced blobs deleted")
+    return paths
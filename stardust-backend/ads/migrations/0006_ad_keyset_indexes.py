@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0005_ad_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['created_at', 'id'], name='ads_ad_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['price', 'id'], name='ads_ad_active_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['author', 'created_at', 'id'], name='ads_ad_author_created_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0006_ad_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['subcategory', 'created_at', 'id'], name='ads_ad_active_subcat_created'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['city', 'created_at', 'id'], name='ads_ad_active_city_created'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['subcategory', 'price', 'id'], name='ads_ad_active_subcat_price'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ads', '0008_ad_status_expires_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='claim_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='claimed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='moderation_claims', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
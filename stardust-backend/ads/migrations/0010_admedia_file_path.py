@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_file_path(apps, schema_editor):
+    """Derive storage paths for existing media from their MEDIA_URL-based URLs"""
+    AdMedia = apps.get_model('ads', 'AdMedia')
+    prefix = settings.MEDIA_URL
+    for media in AdMedia.objects.filter(file_path='', file_url__startswith=prefix).iterator():
+        media.file_path = media.file_url[len(prefix):]
+        media.save(update_fields=['file_path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0009_ad_moderation_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='admedia',
+            name='file_path',
+            field=models.CharField(blank=True, default='', help_text='Storage path of the media file', max_length=255),
+        ),
+        migrations.RunPython(backfill_file_path, migrations.RunPython.noop),
+    ]
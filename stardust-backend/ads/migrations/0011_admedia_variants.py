@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0010_admedia_file_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='admedia',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+# Keep ads_mediablob.ref_count equal to the number of ads_admedia rows per
+# blob. Statement-level triggers with transition tables apply one grouped
+# UPDATE per statement, so bulk inserts and cascaded deletes stay set-based.
+BLOB_REFS_SQL = """
+CREATE FUNCTION ads_admedia_blob_refs() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE ads_mediablob b SET ref_count = b.ref_count + d.n, last_used_at = now()
+        FROM (SELECT blob_id, count(*) AS n FROM new_rows
+              WHERE blob_id IS NOT NULL GROUP BY blob_id) d
+        WHERE b.id = d.blob_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE ads_mediablob b SET ref_count = b.ref_count - d.n, last_used_at = now()
+        FROM (SELECT blob_id, count(*) AS n FROM old_rows
+              WHERE blob_id IS NOT NULL GROUP BY blob_id) d
+        WHERE b.id = d.blob_id;
+    ELSE
+        UPDATE ads_mediablob b SET ref_count = b.ref_count + d.n, last_used_at = now()
+        FROM (SELECT blob_id, sum(n) AS n FROM (
+                  SELECT blob_id, 1 AS n FROM new_rows
+                  UNION ALL
+                  SELECT blob_id, -1 AS n FROM old_rows
+              ) changes
+              WHERE blob_id IS NOT NULL GROUP BY blob_id HAVING sum(n) <> 0) d
+        WHERE b.id = d.blob_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER ads_admedia_blob_refs_insert AFTER INSERT ON ads_admedia
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION ads_admedia_blob_refs();
+CREATE TRIGGER ads_admedia_blob_refs_delete AFTER DELETE ON ads_admedia
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION ads_admedia_blob_refs();
+CREATE TRIGGER ads_admedia_blob_refs_update AFTER UPDATE ON ads_admedia
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION ads_admedia_blob_refs();
+"""
+
+DROP_BLOB_REFS_SQL = """
+DROP TRIGGER ads_admedia_blob_refs_update ON ads_admedia;
+DROP TRIGGER ads_admedia_blob_refs_delete ON ads_admedia;
+DROP TRIGGER ads_admedia_blob_refs_insert ON ads_admedia;
+DROP FUNCTION ads_admedia_blob_refs();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0011_admedia_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('path', models.CharField(help_text='Storage path of the file', max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('ref_count', 0)), fields=['last_used_at'], name='ads_mediablob_unref_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='admedia',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='media', to='ads.mediablob'),
+        ),
+        migrations.RunSQL(BLOB_REFS_SQL, DROP_BLOB_REFS_SQL),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-17 08:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 50000
+
+
+def backfill_hierarchy(apps, schema_editor):
+    """Set category from subcategory, and province/country from city, in id
+    ranges so no single statement holds locks on the whole table"""
+    Ad = apps.get_model('ads', 'Ad')
+    bounds = Ad.objects.aggregate(low=models.Min('id'), high=models.Max('id'))
+    if bounds['low'] is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+            cursor.execute(
+                "UPDATE ads_ad a SET category_id = s.category_id, "
+                "  province_id = c.province_id, country_id = p.country_id "
+                "FROM ads_subcategory s, ads_city c, ads_province p "
+                "WHERE a.subcategory_id = s.id AND a.city_id = c.id AND c.province_id = p.id "
+                "  AND a.id >= %s AND a.id < %s",
+                [start, start + BATCH_SIZE]
+            )
+
+
+class Migration(migrations.Migration):
+
+    # Each backfill batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('ads', '0012_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='category',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='ads.category'),
+        ),
+        migrations.RunPython(backfill_hierarchy, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ad',
+            name='category',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.PROTECT, to='ads.category'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['category', 'created_at', 'id'], name='ads_ad_active_cat_created'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['category', 'price', 'id'], name='ads_ad_active_cat_price'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['province', 'created_at', 'id'], name='ads_ad_active_prov_created'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:12
+
+from django.db import migrations, models
+
+
+# Coordinates for the sample cities created in 0004
+SAMPLE_COORDINATES = {
+    ('Western Cape', 'Cape Town'): (-33.9249, 18.4241),
+    ('Western Cape', 'Stellenbosch'): (-33.9321, 18.8602),
+    ('Western Cape', 'George'): (-33.9630, 22.4617),
+    ('Gauteng', 'Johannesburg'): (-26.2041, 28.0473),
+    ('Gauteng', 'Pretoria'): (-25.7479, 28.2293),
+    ('Gauteng', 'Sandton'): (-26.1076, 28.0567),
+    ('KwaZulu-Natal', 'Durban'): (-29.8587, 31.0218),
+    ('KwaZulu-Natal', 'Pietermaritzburg'): (-29.6006, 30.3794),
+    ('KwaZulu-Natal', 'Newcastle'): (-27.7575, 29.9318),
+    ('California', 'Los Angeles'): (34.0522, -118.2437),
+    ('California', 'San Francisco'): (37.7749, -122.4194),
+    ('California', 'San Diego'): (32.7157, -117.1611),
+    ('New York', 'New York City'): (40.7128, -74.0060),
+    ('New York', 'Albany'): (42.6526, -73.7562),
+    ('New York', 'Buffalo'): (42.8864, -78.8784),
+    ('Texas', 'Houston'): (29.7604, -95.3698),
+    ('Texas', 'Austin'): (30.2672, -97.7431),
+    ('Texas', 'Dallas'): (32.7767, -96.7970),
+    ('England', 'London'): (51.5074, -0.1278),
+    ('England', 'Manchester'): (53.4808, -2.2426),
+    ('England', 'Birmingham'): (52.4862, -1.8904),
+    ('Scotland', 'Edinburgh'): (55.9533, -3.1883),
+    ('Scotland', 'Glasgow'): (55.8642, -4.2518),
+    ('Scotland', 'Aberdeen'): (57.1497, -2.0943),
+    ('Wales', 'Cardiff'): (51.4816, -3.1791),
+    ('Wales', 'Swansea'): (51.6214, -3.9436),
+    ('Wales', 'Newport'): (51.5842, -2.9977),
+}
+
+
+def set_sample_coordinates(apps, schema_editor):
+    City = apps.get_model('ads', 'City')
+    cities = list(City.objects.select_related('province'))
+    for city in cities:
+        city.latitude, city.longitude = SAMPLE_COORDINATES.get(
+            (city.province.name, city.name), (None, None)
+        )
+    City.objects.bulk_update(cities, ['latitude', 'longitude'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0013_ad_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='city',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='city',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='city',
+            index=models.Index(fields=['latitude', 'longitude'], name='ads_city_lat_lon_idx'),
+        ),
+        migrations.RunPython(set_sample_coordinates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:02
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+BATCH_SIZE = 50000
+
+# Starting rates in US dollars per unit; keep current with
+# `manage.py update_exchange_rates`
+USD_RATES = {
+    'USD': Decimal('1'),
+    'ZAR': Decimal('0.055'),
+    'MWK': Decimal('0.00058'),
+}
+
+
+def seed_rates(apps, schema_editor):
+    ExchangeRate = apps.get_model('ads', 'ExchangeRate')
+    base = USD_RATES.get(settings.ADS_BASE_CURRENCY)
+    if base is None:
+        return
+    ExchangeRate.objects.bulk_create([
+        ExchangeRate(currency_code=code, rate=(rate / base).quantize(Decimal('0.00000001')))
+        for code, rate in USD_RATES.items()
+    ])
+
+
+def backfill_price_normalized(apps, schema_editor):
+    """Convert prices in id ranges so no single statement holds locks on the
+    whole table; prices without a rate are left unconverted"""
+    Ad = apps.get_model('ads', 'Ad')
+    bounds = Ad.objects.aggregate(low=models.Min('id'), high=models.Max('id'))
+    if bounds['low'] is None:
+        return
+    base = settings.ADS_BASE_CURRENCY
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+            cursor.execute(
+                "UPDATE ads_ad a SET price_normalized = ROUND(a.price * COALESCE("
+                "  CASE WHEN a.currency_code = %s THEN 1 END,"
+                "  (SELECT r.rate FROM ads_exchangerate r WHERE r.currency_code = a.currency_code),"
+                "  1), 2) "
+                "WHERE a.id >= %s AND a.id < %s",
+                [base, start, start + BATCH_SIZE]
+            )
+
+
+class Migration(migrations.Migration):
+
+    # Each backfill batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('ads', '0014_city_coordinates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency_code', models.CharField(max_length=3, unique=True)),
+                ('rate', models.DecimalField(decimal_places=8, max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(seed_rates, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='ad',
+            name='price_normalized',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=14, null=True),
+        ),
+        migrations.RunPython(backfill_price_normalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ad',
+            name='price_normalized',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=14),
+        ),
+        migrations.RemoveIndex(
+            model_name='ad',
+            name='ads_ad_active_price_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='ad',
+            name='ads_ad_active_subcat_price',
+        ),
+        migrations.RemoveIndex(
+            model_name='ad',
+            name='ads_ad_active_cat_price',
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['price_normalized', 'id'], name='ads_ad_active_pricenorm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['subcategory', 'price_normalized', 'id'], name='ads_ad_active_subcat_pricenorm'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['category', 'price_normalized', 'id'], name='ads_ad_active_cat_pricenorm'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:43
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0015_exchangerate_ad_price_normalized'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('title'), name='text_pattern_ops'), condition=models.Q(('status', 'active')), include=('title',), name='ads_ad_active_title_prefix'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-17 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+BATCH_SIZE = 50000
+
+
+def recompute_price_normalized(apps, schema_editor):
+    """Convert prices again at the new precision, in id ranges like 0015;
+    prices without a rate keep their old value and are left out of price
+    filters (see ads.filters)"""
+    Ad = apps.get_model('ads', 'Ad')
+    bounds = Ad.objects.aggregate(low=models.Min('id'), high=models.Max('id'))
+    if bounds['low'] is None:
+        return
+    base = settings.ADS_BASE_CURRENCY
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+            cursor.execute(
+                "UPDATE ads_ad a SET price_normalized = ROUND(a.price * r.rate, 8) "
+                "FROM ("
+                "  SELECT currency_code, rate FROM ads_exchangerate WHERE currency_code <> %s"
+                "  UNION ALL SELECT %s, 1"
+                ") r "
+                "WHERE a.currency_code = r.currency_code AND a.id >= %s AND a.id < %s",
+                [base, base, start, start + BATCH_SIZE]
+            )
+
+
+class Migration(migrations.Migration):
+
+    # Each batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('ads', '0016_ad_active_title_prefix'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ad',
+            name='price_normalized',
+            field=models.DecimalField(decimal_places=8, editable=False, max_digits=20),
+        ),
+        migrations.RunPython(recompute_price_normalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:42
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0017_ad_price_normalized_precision'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='city',
+            name='ads_city_lat_lon_idx',
+        ),
+    ]
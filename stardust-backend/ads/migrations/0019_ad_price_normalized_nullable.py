@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+BATCH_SIZE = 50000
+
+
+def clear_unrated_prices(apps, schema_editor):
+    """0015 converted prices without a rate at a rate of 1 and 0017 kept
+    those values; clear them, in id ranges like 0015"""
+    Ad = apps.get_model('ads', 'Ad')
+    bounds = Ad.objects.aggregate(low=models.Min('id'), high=models.Max('id'))
+    if bounds['low'] is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+            cursor.execute(
+                "UPDATE ads_ad a SET price_normalized = NULL "
+                "WHERE a.id >= %s AND a.id < %s AND a.currency_code <> %s "
+                "  AND a.price_normalized IS NOT NULL "
+                "  AND NOT EXISTS (SELECT 1 FROM ads_exchangerate r WHERE r.currency_code = a.currency_code)",
+                [start, start + BATCH_SIZE, settings.ADS_BASE_CURRENCY]
+            )
+
+
+class Migration(migrations.Migration):
+
+    # Each batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('ads', '0018_remove_city_lat_lon_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ad',
+            name='price_normalized',
+            field=models.DecimalField(decimal_places=8, editable=False, max_digits=20, null=True),
+        ),
+        migrations.RunPython(clear_unrated_prices, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 from django.conf import settings
+from django.db.models.functions import Lower
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.utils import timezone
 
 class Country(models.Model):
@@ -38,7 +41,8 @@ class SubCategory(models.Model):
         unique_together = ['category', 'slug']
     
     def __str__(self):
-        return f"{self.category.name} > {self.name}"
+        from .registry import name_of
+        return f"{name_of(Category, self.category_id) or self.category.name} > {self.name}"
 
 class Province(models.Model):
     country = models.ForeignKey(Country, related_name='provinces', on_delete=models.PROTECT)
@@ -51,17 +55,36 @@ class Province(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.name}, {self.country.name}"
+        from .registry import name_of
+        return f"{self.name}, {name_of(Country, self.country_id) or self.country.name}"
 
 class City(models.Model):
     province = models.ForeignKey(Province, related_name='cities', on_delete=models.PROTECT)
     name = models.CharField(max_length=100)
+    # WGS84 degrees; loaded with `manage.py load_city_coordinates`
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
     
     class Meta:
         verbose_name_plural = "cities"
     
     def __str__(self):
-        return f"{self.name}, {self.province.name}"
+        from .registry import name_of
+        return f"{self.name}, {name_of(Province, self.province_id) or self.province.name}"
+
+class ExchangeRate(models.Model):
+    """Value of one unit of ``currency_code`` in ``settings.ADS_BASE_CURRENCY``.
+
+    Ad prices are converted with these rates into ``Ad.price_normalized``;
+    changing a rate recomputes the affected ads in bulk (see
+    ``PriceService.renormalize``).
+    """
+    currency_code = models.CharField(max_length=3, unique=True)
+    rate = models.DecimalField(max_digits=18, decimal_places=8)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.currency_code} = {self.rate} {settings.ADS_BASE_CURRENCY}"
 
 class Ad(models.Model):
     STATUS_CHOICES = [
@@ -96,6 +119,9 @@ class Ad(models.Model):
         ('MWK', 'MK')
     ]
 
+    # How long an ad stays listed once it is created or approved
+    LISTING_DURATION = timezone.timedelta(days=30)
+
     # Basic Info
     title = models.CharField(max_length=100)
     description = models.TextField(max_length=2000)
@@ -110,9 +136,17 @@ class Ad(models.Model):
         choices=[(symbol, symbol) for code, symbol in CURRENCY_CHOICES],
         default='R'
     )
+    # price in settings.ADS_BASE_CURRENCY, so prices in different currencies
+    # can be filtered and sorted together. Set on write from ExchangeRate;
+    # finer than cents so low-value currencies keep distinct prices. Null
+    # while the currency has no rate (see ads.currency.exclude_unrated)
+    price_normalized = models.DecimalField(max_digits=20, decimal_places=8, null=True, editable=False)
 
     # Categories and Location
     subcategory = models.ForeignKey(SubCategory, on_delete=models.PROTECT)
+    # Denormalized from subcategory (and province/country from city) on
+    # write, so broad browsing filters need no joins
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, editable=False)
     country = models.ForeignKey(Country, on_delete=models.PROTECT, default=1)
     province = models.ForeignKey(Province, on_delete=models.PROTECT)
     city = models.ForeignKey(City, on_delete=models.PROTECT)
@@ -146,6 +180,21 @@ class Ad(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     expires_at = models.DateTimeField()
     
+    # Moderation queue lease (see ModerationService)
+    claimed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='moderation_claims'
+    )
+    claim_expires_at = models.DateTimeField(null=True, blank=True)
+    
+    # Search
+    # Maintained by the ads_ad_search_vector trigger (see migration 0005):
+    # title is weighted 'A' and description 'B'.
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     class Meta:
         indexes = [
             models.Index(fields=['status', 'created_at']),
@@ -154,12 +203,108 @@ class Ad(models.Model):
             models.Index(fields=['province']),
             models.Index(fields=['city']),
             models.Index(fields=['price']),
-            models.Index(fields=['author'])
+            models.Index(fields=['author']),
+            GinIndex(fields=['search_vector'], name='ads_ad_search_vector_gin'),
+            # Title prefix lookups for typeahead suggestions (see ads.suggest):
+            # text_pattern_ops serves LIKE 'prefix%' whatever the collation,
+            # and including title lets the counts be read from the index alone
+            models.Index(
+                OpClass(Lower('title'), name='text_pattern_ops'),
+                name='ads_ad_active_title_prefix',
+                include=['title'],
+                condition=models.Q(status='active')
+            ),
+            # Keyset pagination: (ordering field, id) for the public listing
+            # and the owner's dashboard.
+            models.Index(
+                fields=['created_at', 'id'],
+                name='ads_ad_active_created_idx',
+                condition=models.Q(status='active')
+            ),
+            models.Index(
+                fields=['price_normalized', 'id'],
+                name='ads_ad_active_pricenorm_idx',
+                condition=models.Q(status='active')
+            ),
+            models.Index(fields=['author', 'created_at', 'id'], name='ads_ad_author_created_idx'),
+            # Expiry sweeper: overdue active ads (see AdLifecycleService.expire_overdue)
+            models.Index(fields=['status', 'expires_at'], name='ads_ad_status_expires_idx'),
+            # Public listing shapes: status='active' + AdFilter field + ordering.
+            # Checked by ads.tests.ListingQueryPlanTests.
+            models.Index(
+                fields=['subcategory', 'created_at', 'id'],
+                name='ads_ad_active_subcat_created',
+                condition=models.Q(status='active')
+            ),
+            models.Index(
+                fields=['city', 'created_at', 'id'],
+                name='ads_ad_active_city_created',
+                condition=models.Q(status='active')
+            ),
+            models.Index(
+                fields=['subcategory', 'price_normalized', 'id'],
+                name='ads_ad_active_subcat_pricenorm',
+                condition=models.Q(status='active')
+            ),
+            models.Index(
+                fields=['category', 'created_at', 'id'],
+                name='ads_ad_active_cat_created',
+                condition=models.Q(status='active')
+            ),
+            models.Index(
+                fields=['category', 'price_normalized', 'id'],
+                name='ads_ad_active_cat_pricenorm',
+                condition=models.Q(status='active')
+            ),
+            models.Index(
+                fields=['province', 'created_at', 'id'],
+                name='ads_ad_active_prov_created',
+                condition=models.Q(status='active')
+            ),
         ]
     
-    def save(self, *args, **kwargs):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Price as loaded, so saves that leave it alone keep price_normalized
+        instance._loaded_price = (instance.__dict__.get('price'), instance.__dict__.get('currency_code'))
+        return instance
+    
+    def price_changed(self):
+        """Whether price or currency differ from the stored row (or it is new)"""
+        return getattr(self, '_loaded_price', None) != (self.price, self.currency_code)
+    
+    def populate_derived_fields(self):
+        """Fill fields computed on write (also used before bulk_create)"""
+        from .currency import get_rate, normalize_price
+        from .registry import lookup
+
         if not self.expires_at:
-            self.expires_at = timezone.now() + timezone.timedelta(days=30)
+            self.expires_at = timezone.now() + self.LISTING_DURATION
+        # Parents come from the in-process registry: no queries
+        subcategory = lookup(SubCategory, self.subcategory_id)
+        if subcategory is not None:
+            self.category_id = subcategory.category_id
+        city = lookup(City, self.city_id)
+        if city is not None:
+            self.province_id = city.province_id
+            self.country_id = city.province.country_id
+        if self.price is not None and self.price_changed():
+            # Left null without a rate; forms and serializers reject new
+            # prices in such a currency, saves that keep the price go through
+            if get_rate(self.currency_code) is None:
+                self.price_normalized = None
+            else:
+                self.price_normalized = normalize_price(self.price, self.currency_code)
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .currency import get_rate
+        if self.currency_code and self.price_changed() and get_rate(self.currency_code) is None:
+            raise ValidationError({'currency_code': f'No exchange rate is set for {self.currency_code}'})
+    
+    def save(self, *args, **kwargs):
+        self.populate_derived_fields()
         super().save(*args, **kwargs)
     
     @property
@@ -178,6 +323,36 @@ class Ad(models.Model):
     def __str__(self):
         return f"{self.title} - {self.get_status_display()}"
 
+class MediaBlob(models.Model):
+    """Stored media file, keyed by the SHA-256 of its content.
+
+    Identical uploads share one blob. ``ref_count`` is the number of
+    ``AdMedia`` rows pointing at it and is maintained by database triggers
+    (see migration 0012), so bulk and cascaded deletes keep it exact.
+    Unreferenced blobs are removed by ``ads.media.collect_blobs``.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    path = models.CharField(max_length=255, help_text="Storage path of the file")
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever an upload reuses the blob or a reference is added or
+    # dropped; garbage collection leaves recently used blobs alone
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['last_used_at'],
+                name='ads_mediablob_unref_idx',
+                condition=models.Q(ref_count=0)
+            ),
+        ]
+
+    def __str__(self):
+        return self.sha256
+
+
 class AdMedia(models.Model):
     MEDIA_TYPES = [
         ('image', 'Image'),
@@ -192,12 +367,29 @@ class AdMedia(models.Model):
     file_url = models.URLField(
         help_text="URL to the media file"
     )
+    file_path = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        help_text="Storage path of the media file"
+    )
+    # Null for media stored per ad before content-addressed storage
+    blob = models.ForeignKey(
+        MediaBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='media'
+    )
     media_type = models.CharField(
         max_length=5,
         choices=MEDIA_TYPES,
         default='image'
     )
     is_thumbnail = models.BooleanField(default=False)
+    # {name: {path, url, width, height}} for each ADS_MEDIA_VARIANTS entry,
+    # filled in by ads.images after upload
+    variants = models.JSONField(default=dict, blank=True)
     upload_date = models.DateTimeField(
         auto_now_add=True,
         db_index=True
@@ -0,0 +1,313 @@
+import base64
+import binascii
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import BooleanField, F, Func, Value
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class RowComparison(Func):
+    """SQL row-value comparison, e.g. ``(created_at, id) < (%s, %s)``.
+
+    Postgres turns this into a single index condition on a matching
+    composite index, which a chain of ``OR``-ed column comparisons is not.
+    """
+    output_field = BooleanField()
+
+    def __init__(self, fields, values, operator):
+        self.operator = operator
+        self.width = len(fields)
+        super().__init__(*[F(field) for field in fields], *values)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql_parts, params = [], []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            sql_parts.append(sql)
+            params.extend(expression_params)
+        lhs = ', '.join(sql_parts[:self.width])
+        rhs = ', '.join(sql_parts[self.width:])
+        return f"({lhs}) {self.operator} ({rhs})", params
+
+
+class KeysetPagination(BasePagination):
+    """Opaque-cursor pagination keyed on ``(<ordering field>, id)``.
+
+    Each page is a single index range scan starting after the previous
+    page's last row, so page 1000 costs the same as page 1 and no
+    ``COUNT(*)`` is issued. Only orderings backed by a ``(field, id)``
+    index are accepted.
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    default_limit = 20
+    max_limit = 100
+    keyset_fields = ('created_at', 'price', 'price_normalized')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        field, descending = self.get_ordering(queryset)
+        self.ordering = f"{'-' if descending else ''}{field}"
+
+        model_field = queryset.model._meta.get_field(field)
+        cursor = self.decode_cursor(request, model_field, queryset.model._meta.pk)
+        reverse = bool(cursor and cursor['reverse'])
+        # Walking backwards is a forward walk over the flipped ordering.
+        walk_descending = descending != reverse
+        prefix = '-' if walk_descending else ''
+        queryset = queryset.order_by(f'{prefix}{field}', f'{prefix}id')
+
+        if cursor is not None:
+            queryset = queryset.filter(RowComparison(
+                [field, 'id'],
+                [
+                    Value(cursor['value'], output_field=model_field),
+                    Value(cursor['id'], output_field=queryset.model._meta.pk),
+                ],
+                '<' if walk_descending else '>'
+            ))
+
+        rows = list(queryset[:self.limit + 1])
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.next_cursor = self.encode_cursor(rows[-1], field) if rows and self.has_next else None
+        self.previous_cursor = (
+            self.encode_cursor(rows[0], field, reverse=True) if rows and self.has_previous else None
+        )
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'data': data,
+            'pagination': {
+                'limit': self.limit,
+                'ordering': self.ordering,
+                'next_cursor': self.next_cursor,
+                'previous_cursor': self.previous_cursor,
+                'has_next': self.has_next,
+                'has_previous': self.has_previous,
+            }
+        })
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        return max(1, min(limit, self.max_limit))
+
+    def get_ordering(self, queryset):
+        ordering = list(queryset.query.order_by) or ['-created_at']
+        primary = ordering[0] if isinstance(ordering[0], str) else ''
+        field = primary.lstrip('-')
+        if field not in self.keyset_fields:
+            raise ValidationError({
+                'ordering': (
+                    f"Cursor pagination supports ordering by "
+                    f"{', '.join(self.keyset_fields)} only"
+                )
+            })
+        return field, primary.startswith('-')
+
+    def decode_cursor(self, request, model_field, pk_field):
+        """The cursor in ``request``, with its value and id parsed by
+        ``model_field`` and ``pk_field``, or None on the first page"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            cursor = {
+                'ordering': payload['o'],
+                'value': self.parse_key(model_field, payload['v']),
+                'id': self.parse_key(pk_field, payload['i']),
+                'reverse': bool(payload.get('r')),
+            }
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        # A cursor is only meaningful for the ordering it was issued for.
+        if cursor['ordering'] != self.ordering:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    @staticmethod
+    def parse_key(model_field, value):
+        """``value`` as a Python value of ``model_field``, so a tampered
+        cursor fails here rather than when the query runs"""
+        if value is None:
+            raise ValueError('Cursor keys are never null')
+        value = model_field.to_python(value)
+        # Range of integer columns, digits of decimal ones
+        model_field.run_validators(value)
+        return value
+
+    def encode_cursor(self, row, field, reverse=False):
+        value = row[field] if isinstance(row, dict) else getattr(row, field)
+        row_id = row['id'] if isinstance(row, dict) else row.id
+        payload = {
+            'o': self.ordering,
+            'v': value.isoformat() if hasattr(value, 'isoformat') else str(value),
+            'i': row_id,
+        }
+        if reverse:
+            payload['r'] = 1
+        return base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        ).decode('ascii')
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque cursor; pass an empty value for the first page',
+                'schema': {'type': 'string'},
+            },
+        ]
+
+
+def get_count_settings():
+    return {
+        'STRATEGY': 'capped',
+        'THRESHOLD': 10000,
+        'CACHE_TIMEOUT': 300,
+        **getattr(settings, 'ADS_PAGINATION_COUNT', {}),
+    }
+
+
+def count_cache_key(queryset, strategy):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(f"{sql}|{params!r}".encode('utf-8')).hexdigest()
+    return f"ads:count:{strategy}:{digest}"
+
+
+def estimate_count(queryset):
+    """Planner row estimate for ``queryset`` (no rows are read)"""
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_with_strategy(queryset):
+    """Return ``(total, strategy)`` for a listing queryset.
+
+    At most THRESHOLD + 1 rows are counted. Below the threshold the total is
+    exact; above it the configured strategy decides what to report, and
+    the result is cached for CACHE_TIMEOUT seconds under the query's SQL.
+    """
+    options = get_count_settings()
+    strategy = options['STRATEGY']
+    queryset = queryset.order_by()
+    if strategy == 'exact' or queryset.query.is_empty():
+        return queryset.count(), 'exact'
+
+    key = count_cache_key(queryset, strategy)
+    cached = cache.get(key)
+    if cached is not None:
+        return tuple(cached)
+
+    threshold = options['THRESHOLD']
+    total = queryset.values('pk')[:threshold + 1].count()
+    if total <= threshold:
+        return total, 'exact'
+
+    if strategy == 'estimate':
+        result = (max(estimate_count(queryset), threshold + 1), 'estimate')
+    else:
+        result = (threshold, 'capped')
+    cache.set(key, result, options['CACHE_TIMEOUT'])
+    return result
+
+
+class CustomPagination(LimitOffsetPagination):
+    """Custom pagination class matching OpenAPI spec.
+
+    Passing ``?cursor=`` (empty for the first page) switches to keyset
+    pagination; the ``data``/``pagination`` envelope is kept in both modes.
+    ``total_strategy`` tells clients whether ``total`` is exact, a lower
+    bound (``capped``) or a planner ``estimate``.
+    """
+    default_limit = 20
+    limit_query_param = 'limit'
+    offset_query_param = 'offset'
+    max_limit = 100
+    cursor_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.cursor_pagination_class.cursor_query_param in request.query_params:
+            self.keyset = self.cursor_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.count, self.count_strategy = count_with_strategy(queryset)
+        self.offset = self.get_offset(request)
+        if self.count_strategy == 'exact':
+            self.has_next = self.offset + self.limit < self.count
+            if self.count == 0 or self.offset > self.count:
+                return []
+            return list(queryset[self.offset:self.offset + self.limit])
+
+        # The total is not exact, so look one row ahead to find the end.
+        rows = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        rows = rows[:self.limit]
+        if rows:
+            self.count = max(self.count, self.offset + len(rows))
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return Response({
+            'data': data,
+            'pagination': {
+                'total': self.count,
+                'total_strategy': self.count_strategy,
+                'total_is_exact': self.count_strategy == 'exact',
+                'limit': self.limit,
+                'offset': self.offset,
+                'has_next': self.has_next,
+                'has_previous': self.offset > 0,
+            }
+        })
+
+    def get_next_link(self):
+        # Based on has_next rather than count, which may be a lower bound
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_schema_operation_parameters(self, view):
+        return (
+            super().get_schema_operation_parameters(view)
+            + self.cursor_pagination_class().get_schema_operation_parameters(view)
+        )
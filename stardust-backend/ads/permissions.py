@@ -0,0 +1,17 @@
+from rest_framework import permissions
+
+
+def is_moderator(user):
+    """Whether ``user`` has the moderator or admin role, or is staff"""
+    return bool(
+        user and user.is_authenticated
+        and (user.is_staff or getattr(user, 'role', None) in ('moderator', 'admin'))
+    )
+
+
+class IsModerator(permissions.BasePermission):
+    """Users with the moderator or admin role, or staff"""
+    message = "Moderator access required"
+
+    def has_permission(self, request, view):
+        return is_moderator(request.user)
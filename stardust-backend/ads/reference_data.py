@@ -0,0 +1,78 @@
+"""Precomputed payloads for the taxonomy and geography endpoints.
+
+Categories, countries and locations change only when an admin edits them,
+so each endpoint's JSON (and a gzipped copy) is rendered once and cached
+under the current reference-data version. Saving or deleting any of the
+reference models bumps the version (see ``ads.signals``), which makes
+every worker rebuild on its next request.
+"""
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from .models import Category, Country
+from .registry import get_reference_version
+from .serializers import (
+    CategoryWithSubcategoriesSerializer, CountryListSerializer, CountrySerializer
+)
+
+
+def build_categories():
+    categories = Category.objects.prefetch_related('subcategories').all()
+    return CategoryWithSubcategoriesSerializer(categories, many=True).data
+
+
+def build_countries():
+    return CountryListSerializer(Country.objects.all(), many=True).data
+
+
+def build_locations():
+    countries = Country.objects.prefetch_related('provinces__cities').all()
+    return CountrySerializer(countries, many=True).data
+
+
+PAYLOAD_BUILDERS = {
+    'categories': build_categories,
+    'countries': build_countries,
+    'locations': build_locations,
+}
+
+
+def get_reference_payload(name):
+    """Return ``(body, gzipped_body, etag)`` for a reference endpoint"""
+    key = f"ads:reference:{name}:{get_reference_version()}"
+    payload = cache.get(key)
+    if payload is None:
+        body = JSONRenderer().render(PAYLOAD_BUILDERS[name]())
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        payload = (body, gzip.compress(body, compresslevel=9), etag)
+        cache.set(key, payload, settings.ADS_REFERENCE_CACHE_TIMEOUT)
+    return payload
+
+
+def reference_response(request, name):
+    """Serve a precomputed payload with a strong ETag and long Cache-Control"""
+    body, gzipped_body, etag = get_reference_payload(name)
+
+    use_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    # Strong ETags are per representation, so the gzipped body gets its own.
+    etag = f'"{etag}-gzip"' if use_gzip else f'"{etag}"'
+    cache_control = f"public, max-age={settings.ADS_REFERENCE_MAX_AGE}"
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(gzipped_body if use_gzip else body, content_type='application/json')
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
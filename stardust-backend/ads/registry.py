@@ -0,0 +1,143 @@
+"""Process-local registry of the taxonomy, geography and exchange-rate tables.
+
+Categories, subcategories, countries, provinces, cities and exchange rates
+are small and change only when an admin edits them. Each process loads
+them once into ``ReferenceRegistry`` (six queries) with every parent
+relation wired up, so resolving an ID, a name, a city -> province ->
+country chain or a rate costs no query. Instances are shared between requests and must not be modified.
+
+Saving or deleting any reference model bumps the reference-data version
+in the shared cache (see ``ads.signals``). Processes compare their
+snapshot's version with it at most every
+``ADS_REFERENCE_REGISTRY_CHECK_INTERVAL`` seconds, so with a cache shared
+by every process (``REDIS_URL``) renames show up within the interval.
+The bump never reaches processes with their own memory cache, so an ID or
+exchange rate missing from the snapshot is looked up in the database, and
+the snapshot is rebuilt when the row exists: a new row is usable at once
+in every process.
+"""
+import threading
+import time
+import uuid
+from functools import cached_property
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .geo import CityProximityIndex
+from .models import Category, SubCategory, Country, Province, City, ExchangeRate
+
+
+REFERENCE_VERSION_KEY = 'ads:reference:version'
+
+
+def get_reference_version():
+    version = cache.get(REFERENCE_VERSION_KEY)
+    if version is None:
+        cache.add(REFERENCE_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(REFERENCE_VERSION_KEY)
+    return version
+
+
+def bump_reference_version():
+    cache.set(REFERENCE_VERSION_KEY, uuid.uuid4().hex, None)
+    clear_registry()
+
+
+class ReferenceRegistry:
+    """Snapshot of the reference tables, keyed by model and primary key"""
+
+    def __init__(self, version):
+        self.version = version
+        self.categories = Category.objects.in_bulk()
+        self.subcategories = SubCategory.objects.in_bulk()
+        self.countries = Country.objects.in_bulk()
+        self.provinces = Province.objects.in_bulk()
+        self.cities = City.objects.in_bulk()
+        self.exchange_rates = dict(ExchangeRate.objects.values_list('currency_code', 'rate'))
+
+        # Populate the foreign key caches so parents resolve in memory
+        for subcategory in self.subcategories.values():
+            subcategory.category = self.categories[subcategory.category_id]
+        for province in self.provinces.values():
+            province.country = self.countries[province.country_id]
+        for city in self.cities.values():
+            city.province = self.provinces[city.province_id]
+
+        self.by_model = {
+            Category: self.categories,
+            SubCategory: self.subcategories,
+            Country: self.countries,
+            Province: self.provinces,
+            City: self.cities,
+        }
+
+    @cached_property
+    def city_index(self):
+        """Cities by location, for proximity search (see ``ads.geo``)"""
+        return CityProximityIndex(self.cities.values())
+
+
+_registry = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_registry(check=False):
+    """The current snapshot, rebuilt if the reference version has changed.
+
+    The version is read from the cache at most once per check interval,
+    unless ``check`` is set.
+    """
+    global _registry, _checked_at
+    registry = _registry
+    now = time.monotonic()
+    if registry is not None and not check and now - _checked_at < settings.ADS_REFERENCE_REGISTRY_CHECK_INTERVAL:
+        return registry
+
+    version = get_reference_version()
+    if registry is None or registry.version != version:
+        with _lock:
+            if _registry is None or _registry.version != version:
+                _registry = ReferenceRegistry(version)
+            registry = _registry
+    _checked_at = now
+    return registry
+
+
+def reload_registry(stale):
+    """Rebuild the snapshot, which the database has shown ``stale`` to be;
+    returns the current one"""
+    global _registry, _checked_at
+    with _lock:
+        if _registry is None or _registry is stale:
+            _registry = ReferenceRegistry(get_reference_version())
+            _checked_at = time.monotonic()
+        return _registry
+
+
+def clear_registry():
+    """Drop this process's snapshot; the next lookup reloads it"""
+    global _registry
+    _registry = None
+
+
+def lookup(model, pk):
+    """The registry instance of ``model`` with primary key ``pk``, or None"""
+    registry = get_registry()
+    if pk is not None and pk not in registry.by_model[model]:
+        # Possibly created since the snapshot was taken
+        registry = get_registry(check=True)
+        if pk not in registry.by_model[model] and model.objects.filter(pk=pk).exists():
+            registry = reload_registry(registry)
+    return registry.by_model[model].get(pk)
+
+
+def name_of(model, pk):
+    instance = lookup(model, pk)
+    return instance.name if instance is not None else None
+
+
+def location_label(city_id, province_id):
+    """``"City, Province"`` as shown in ad listings"""
+    return f"{name_of(City, city_id)}, {name_of(Province, province_id)}"
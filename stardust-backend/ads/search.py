@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from rest_framework.filters import OrderingFilter, SearchFilter
+
+from .currency import exclude_unrated
+
+
+# Must match the text search configuration used by the ads_ad_search_vector
+# trigger (migration 0005), otherwise stemming differs between the stored
+# vectors and the query.
+SEARCH_CONFIG = 'english'
+
+
+def get_search_text(request, search_param=None):
+    """Return the raw ``?search=`` value, or an empty string"""
+    search_param = search_param or SearchFilter.search_param
+    return request.query_params.get(search_param, '').replace('\x00', '').strip()
+
+
+def get_search_query(search_text):
+    """``SearchQuery`` for ``search_text`` in web-search syntax"""
+    return SearchQuery(search_text, config=SEARCH_CONFIG, search_type='websearch')
+
+
+class AdSearchFilter(SearchFilter):
+    """Full-text search over Ad.search_vector.
+
+    Replaces the ILIKE-based ``SearchFilter`` so ``?search=`` is answered
+    from the GIN index. Accepts web-search syntax (quoted phrases, ``or``,
+    ``-term``). Relevance is ranked by ``AdOrderingFilter``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_text = get_search_text(request, self.search_param)
+        if not search_text:
+            return queryset
+        return queryset.filter(search_vector=get_search_query(search_text))
+
+
+class AdOrderingFilter(OrderingFilter):
+    """Ordering filter that sorts search results by relevance by default.
+
+    Ranking reads the search vector of every match, so only searches with at
+    most ``ADS_SEARCH_RANK_LIMIT`` matches are ranked (and annotated with
+    ``search_rank``); broader ones are listed newest first.
+
+    ``distance`` is only valid when ``?near=`` annotated it (see
+    ``AdFilter.filter_near``); otherwise it is ignored like any unknown field.
+    Ads at the same distance (same city) are newest first. ``price`` sorts
+    on the price converted to the base currency, so currencies interleave
+    correctly; ads whose price has no converted value are left out.
+    """
+    search_ordering = ['-search_rank', '-created_at']
+    annotated_fields = {'distance'}
+    # Public ordering name -> column actually sorted on
+    field_columns = {'price': 'price_normalized'}
+
+    def get_default_ordering(self, view):
+        if get_search_text(view.request):
+            return self.search_ordering
+        return super().get_default_ordering(view)
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if ordering == self.search_ordering:
+            limit = settings.ADS_SEARCH_RANK_LIMIT
+            if queryset.order_by()[limit:limit + 1].exists():
+                ordering = ordering[1:]
+            else:
+                query = get_search_query(get_search_text(request))
+                queryset = queryset.annotate(search_rank=SearchRank(F('search_vector'), query))
+        if any(term.lstrip('-') == 'price_normalized' for term in ordering or ()):
+            queryset = exclude_unrated(queryset)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        ordering = [
+            term for term in super().remove_invalid_fields(queryset, fields, view, request)
+            if term.lstrip('-') not in self.annotated_fields
+            or term.lstrip('-') in queryset.query.annotations
+        ]
+        if ordering and ordering[-1].lstrip('-') in self.annotated_fields:
+            ordering.append('-created_at')
+        return [self.column_for(term) for term in ordering]
+
+    def column_for(self, term):
+        descending = term.startswith('-')
+        field = term.lstrip('-')
+        return f"{'-' if descending else ''}{self.field_columns.get(field, field)}"
@@ -1,18 +1,21 @@
 from rest_framework import serializers
+from django.conf import settings
+from .clusters import tile_ranges
+from .currency import get_rate
 from .models import Ad, Category, SubCategory, AdMedia, Country, Province, City
-from django.utils import timezone
+from .registry import location_label, lookup
 import re
 
 
 class AdMediaSerializer(serializers.ModelSerializer):
     class Meta:
         model = AdMedia
-        fields = ['id', 'file_url', 'media_type', 'is_thumbnail', 'upload_date']
-        read_only_fields = ['upload_date']
+        fields = ['id', 'file_url', 'media_type', 'is_thumbnail', 'variants', 'upload_date']
+        read_only_fields = ['variants', 'upload_date']
 
 
 class AdSerializer(serializers.ModelSerializer):
-    category = serializers.CharField(source='subcategory.category.name', read_only=True)
+    category = serializers.SerializerMethodField()
     subcategory_id = serializers.PrimaryKeyRelatedField(queryset=SubCategory.objects.all(), source='subcategory')
     media = AdMediaSerializer(many=True, read_only=True)
 
@@ -28,6 +31,10 @@ class AdSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at', 'updated_at', 'views', 'inquiries']
 
+    def get_category(self, obj):
+        subcategory = lookup(SubCategory, obj.subcategory_id)
+        return subcategory.category.name if subcategory else None
+
     def validate(self, data):
         user = self.context.get('request', {}).user if self.context.get('request') else None
         if user and not user.is_authenticated:
@@ -78,7 +85,31 @@ class CountrySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'code', 'currency_code', 'provinces']
 
 
+class ReferencePrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Resolves taxonomy/geography PKs from the in-process reference
+    registry (see ads.registry) instead of one query per field"""
+
+    REFERENCE_MODELS = (Category, SubCategory, Country, Province, City)
+
+    def to_internal_value(self, data):
+        model = self.get_queryset().model
+        if model not in self.REFERENCE_MODELS:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instance = lookup(model, pk)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
+
+
 class AdCreateSerializer(serializers.ModelSerializer):
+    serializer_related_field = ReferencePrimaryKeyRelatedField
+    
     class Meta:
         model = Ad
         fields = [
@@ -109,14 +140,34 @@ class AdCreateSerializer(serializers.ModelSerializer):
         return value
         
     def validate(self, data):
-        if data['contact_method'] in ['phone', 'both'] and not data.get('contact_phone'):
+        currency_code = data.get('currency_code', Ad._meta.get_field('currency_code').default)
+        if get_rate(currency_code) is None:
+            # Its price could not be compared with other ads
+            raise serializers.ValidationError(
+                {"currency_code": f"Prices in {currency_code} are not accepted yet"}
+            )
+        contact_method = data.get('contact_method', Ad._meta.get_field('contact_method').default)
+        if contact_method in ['phone', 'both'] and not data.get('contact_phone'):
             raise serializers.ValidationError(
                 {"contact_phone": "Phone number is required for this contact method"}
             )
-        if data['contact_method'] in ['email', 'both'] and not data.get('contact_email'):
+        if contact_method in ['email', 'both'] and not data.get('contact_email'):
             raise serializers.ValidationError(
                 {"contact_email": "Email is required for this contact method"}
             )
+        
+        # Registry instances have their parents loaded, so no queries here
+        city, province = data.get('city'), data.get('province')
+        if city and province and city.province_id != province.id:
+            raise serializers.ValidationError(
+                {"city": "City does not belong to the selected province"}
+            )
+        if province:
+            country = data.setdefault('country', province.country)
+            if province.country_id != country.id:
+                raise serializers.ValidationError(
+                    {"province": "Province does not belong to the selected country"}
+                )
         return data
     
     def create(self, validated_data):
@@ -127,7 +178,96 @@ class AdCreateSerializer(serializers.ModelSerializer):
         return Ad.objects.create(**validated_data)
 
 
-class AdSummarySerializer(serializers.ModelSerializer):
+# Ad columns (``only()``/``values()`` paths) each output field is built from.
+# Fields missing here are computed from others or prefetched (``media``).
+AD_FIELD_SOURCES = {
+    'id': ('id',),
+    'title': ('title',),
+    'price': ('price', 'currency_symbol'),
+    'location': ('city', 'province'),
+    'currency_code': ('currency_code',),
+    'ad_type': ('ad_type',),
+    'thumbnail': ('thumbnail',),
+    'created_at': ('created_at',),
+    'description': ('description',),
+    'author_id': ('author',),
+    'contact_visibility': ('contact_visibility',),
+    'contact_method': ('contact_method',),
+    'contact_info': ('contact_visibility', 'contact_method', 'contact_phone', 'contact_email'),
+    'is_expired': ('expires_at',),
+    'updated_at': ('updated_at',),
+    'expires_at': ('expires_at',),
+    'media': (),
+    'views': ('views',),
+    'status': ('status',),
+    'inquiries': ('inquiries',),
+}
+
+
+def get_requested_fields(request, available):
+    """Apply ``?fields=a,b`` and ``?exclude=c`` to ``available`` (order kept)"""
+    def parse(param):
+        value = request.query_params.get(param) if request is not None else None
+        return [name.strip() for name in value.split(',') if name.strip()] if value else None
+
+    requested, excluded = parse('fields'), parse('exclude') or []
+    unknown = set(requested or []).union(excluded) - set(available)
+    if unknown:
+        raise serializers.ValidationError({
+            'fields': f"Unknown field(s): {', '.join(sorted(unknown))}"
+        })
+    return [
+        name for name in available
+        if (requested is None or name in requested) and name not in excluded
+    ]
+
+
+def get_field_columns(fields, required=('id',)):
+    """Ad columns needed to render ``fields``, plus ``required``"""
+    columns = dict.fromkeys(required)
+    for name in fields:
+        columns.update(dict.fromkeys(AD_FIELD_SOURCES[name]))
+    return list(columns)
+
+
+def ordering_columns(queryset):
+    """Columns ``queryset`` is ordered by (or the model's default ordering)"""
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+    return tuple(
+        term.lstrip('-') for term in ordering
+        if isinstance(term, str) and term != '?'
+    )
+
+
+def trim_ad_queryset(queryset, fields):
+    """Narrow an Ad queryset to what ``fields`` need: columns, joins, prefetches.
+
+    Ordering columns are always loaded, since keyset pagination builds its
+    cursors from them; order the queryset before trimming it.
+    """
+    columns = get_field_columns(fields, ('id', *ordering_columns(queryset)))
+    relations = sorted({column.split('__')[0] for column in columns if '__' in column})
+    # select_related() with no arguments would follow every foreign key
+    queryset = queryset.select_related(*relations) if relations else queryset.select_related(None)
+    queryset = queryset.only(*columns)
+    if 'media' in fields:
+        queryset = queryset.prefetch_related('media')
+    return queryset
+
+
+class SparseFieldsetMixin:
+    """Drop serializer fields not selected by ``?fields=`` / ``?exclude=``"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is not None:
+            selected = get_requested_fields(request, list(self.fields))
+            for name in set(self.fields) - set(selected):
+                self.fields.pop(name)
+
+
+class AdSummarySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     location = serializers.SerializerMethodField()
     price = serializers.SerializerMethodField()
     
@@ -139,12 +279,61 @@ class AdSummarySerializer(serializers.ModelSerializer):
         ]
     
     def get_location(self, obj):
-        return f"{obj.city.name}, {obj.province.name}"
+        return location_label(obj.city_id, obj.province_id)
     
     def get_price(self, obj):
         return f"{obj.currency_symbol} {obj.price:,.2f}"
 
 
+class AdSummaryProjection:
+    """Fast path producing exactly ``AdSummarySerializer`` output.
+
+    ``project()`` narrows a queryset to the columns the selected fields
+    need via ``values()`` (no joins: location names come from the
+    reference registry), and ``serialize()`` builds the output dicts
+    directly instead of running one field object and
+    ``SerializerMethodField`` call per row.
+    """
+    # Always selected: pagination cursors are built from these
+    key_columns = ('id', 'created_at', 'price', 'price_normalized')
+
+    def __init__(self, fields=None):
+        self.fields = list(fields or AdSummarySerializer.Meta.fields)
+        # Reuse DRF's field so timestamps follow the configured format/timezone
+        created_at = serializers.DateTimeField().to_representation
+        renderers = {
+            'id': lambda row: row['id'],
+            'title': lambda row: row['title'],
+            'price': lambda row: f"{row['currency_symbol']} {row['price']:,.2f}",
+            'location': lambda row: location_label(row['city'], row['province']),
+            'currency_code': lambda row: row['currency_code'],
+            'ad_type': lambda row: row['ad_type'],
+            'thumbnail': lambda row: row['thumbnail'],
+            'created_at': lambda row: created_at(row['created_at']),
+        }
+        self.renderers = [(name, renderers[name]) for name in self.fields]
+
+    @classmethod
+    def from_request(cls, request):
+        return cls(get_requested_fields(request, AdSummarySerializer.Meta.fields))
+
+    def project(self, queryset):
+        columns = get_field_columns(self.fields, self.key_columns)
+        # Set by ?near= (AdFilter.filter_near)
+        if 'distance' in queryset.query.annotations:
+            columns.append('distance')
+        return queryset.values(*columns)
+
+    def to_representation(self, row):
+        data = {name: render(row) for name, render in self.renderers}
+        if 'distance' in row:
+            data['distance_km'] = round(row['distance'], 1)
+        return data
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
 class AdDetailSerializer(AdSummarySerializer):
     contact_info = serializers.SerializerMethodField()
     media = serializers.SerializerMethodField()
@@ -155,8 +344,9 @@ class AdDetailSerializer(AdSummarySerializer):
         fields = AdSummarySerializer.Meta.fields + [
             'description', 'author_id', 'contact_visibility',
             'contact_method', 'contact_info', 'is_expired',
-            'updated_at', 'expires_at', 'media'
+            'updated_at', 'expires_at', 'media', 'views'
         ]
+        read_only_fields = ['views']
     
     def get_contact_info(self, obj):
         request = self.context.get('request')
@@ -207,6 +397,17 @@ class AdUpdateSerializer(serializers.ModelSerializer):
         if value and not re.match(r'^\+?[1-9]\d{1,14}$', value):
             raise serializers.ValidationError("Invalid phone number format")
         return value
+    
+    def validate(self, data):
+        if self.instance is None or data.get('price', self.instance.price) == self.instance.price:
+            return data
+        currency_code = self.instance.currency_code
+        if get_rate(currency_code) is None:
+            # The new price could not be compared with other ads
+            raise serializers.ValidationError(
+                {"price": f"Prices in {currency_code} cannot be changed until an exchange rate is set"}
+            )
+        return data
 
 
 class UserAdSummarySerializer(AdSummarySerializer):
@@ -218,6 +419,52 @@ class UserAdSummarySerializer(AdSummarySerializer):
         fields = AdSummarySerializer.Meta.fields + ['status', 'views', 'inquiries']
 
 
+class MapClustersQuerySerializer(serializers.Serializer):
+    """``bbox=<south>,<west>,<north>,<east>`` and ``zoom`` of the map clusters endpoint"""
+    bbox = serializers.CharField()
+    zoom = serializers.IntegerField(min_value=0, max_value=settings.ADS_MAP_MAX_ZOOM)
+
+    def validate_bbox(self, value):
+        try:
+            south, west, north, east = (float(part) for part in value.split(','))
+        except ValueError:
+            raise serializers.ValidationError('Expected "south,west,north,east" in decimal degrees')
+        if not (-90 <= south < north <= 90 and -180 <= west < east <= 180):
+            raise serializers.ValidationError('Bounding box is out of range or empty')
+        return south, west, north, east
+
+    def validate(self, data):
+        tiles_x, tiles_y = tile_ranges(data['bbox'], data['zoom'])
+        tiles = (tiles_x[1] - tiles_x[0] + 1) * (tiles_y[1] - tiles_y[0] + 1)
+        if tiles > settings.ADS_MAP_MAX_TILES:
+            raise serializers.ValidationError(
+                {'zoom': 'Bounding box is too large for this zoom level'}
+            )
+        return data
+
+
+class PriceHistogramQuerySerializer(serializers.Serializer):
+    """``buckets``, ``scale`` and ``currency`` of the price histogram endpoint"""
+    buckets = serializers.IntegerField(
+        min_value=1, max_value=settings.ADS_PRICE_HISTOGRAM_MAX_BUCKETS,
+        default=settings.ADS_PRICE_HISTOGRAM_BUCKETS
+    )
+    scale = serializers.ChoiceField(choices=['linear', 'quantile'], default='linear')
+    # Raw prices of ads in this currency; normalized prices of all ads if omitted
+    currency = serializers.ChoiceField(
+        choices=[code for code, symbol in Ad.CURRENCY_CHOICES], required=False
+    )
+
+
+class SuggestQuerySerializer(serializers.Serializer):
+    """``q`` and ``limit`` of the typeahead suggestions endpoint"""
+    q = serializers.CharField(max_length=100, trim_whitespace=False)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.ADS_SUGGEST_MAX_LIMIT,
+        default=settings.ADS_SUGGEST_DEFAULT_LIMIT
+    )
+
+
 class CountryWithProvincesSerializer(serializers.Serializer):
     country = serializers.CharField()
     provinces = ProvinceSerializer(many=True)
@@ -232,6 +479,8 @@ class CountryListSerializer(serializers.ModelSerializer):
 
 class PaginationInfoSerializer(serializers.Serializer):
     total = serializers.IntegerField()
+    total_strategy = serializers.ChoiceField(choices=['exact', 'capped', 'estimate'])
+    total_is_exact = serializers.BooleanField()
     limit = serializers.IntegerField()
     offset = serializers.IntegerField()
     has_next = serializers.BooleanField()
@@ -0,0 +1,295 @@
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils import timezone
+import logging
+
+from .currency import NORMALIZED_PLACES
+from .models import Ad, ExchangeRate
+from .serializers import AdCreateSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class AdBatchService:
+    """Create many ads with query-free validation and a single bulk insert.
+
+    Foreign keys are resolved from the reference registry (see
+    ``ReferencePrimaryKeyRelatedField``), so validating a batch issues no
+    queries.
+    """
+
+    @staticmethod
+    def format_errors(errors):
+        if not isinstance(errors, dict):
+            return [{"field": "non_field_errors", "message": str(errors)}]
+        return [
+            {"field": field, "message": str(messages[0]) if isinstance(messages, list) else str(messages)}
+            for field, messages in errors.items()
+        ]
+
+    @staticmethod
+    def create_ads(user, items):
+        """Validate ``items`` and insert the valid ones in one transaction.
+
+        Returns one result per item, in input order: ``{"index", "status":
+        "created", "id"}`` or ``{"index", "status": "error", "errors"}``.
+        """
+        results = []
+        ads = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results.append({
+                    "index": index,
+                    "status": "error",
+                    "errors": [{"field": "non_field_errors", "message": "Expected an object"}]
+                })
+                continue
+            serializer = AdCreateSerializer(data=item)
+            if not serializer.is_valid():
+                results.append({
+                    "index": index,
+                    "status": "error",
+                    "errors": AdBatchService.format_errors(serializer.errors)
+                })
+                continue
+            # Same defaults as AdCreateSerializer.create()
+            ad = Ad(**serializer.validated_data, author=user, status='pending_approval')
+            ad.populate_derived_fields()
+            results.append({"index": index, "status": "created"})
+            ads.append((ad, results[-1]))
+
+        if ads:
+            with transaction.atomic():
+                Ad.objects.bulk_create(
+                    [ad for ad, _ in ads],
+                    batch_size=settings.ADS_BATCH_CREATE_INSERT_SIZE
+                )
+            for ad, result in ads:
+                result["id"] = ad.id
+            logger.info(f"Batch created {len(ads)} ads for user {user.id}")
+
+        return results
+
+
+class AdLifecycleService:
+    """Set-based status changes for many ads at once.
+
+    Callers scope the queryset (the owner's ads in the API, any selection
+    in the admin); each operation is a single statement and returns the
+    ids it actually changed.
+    """
+
+    # action -> (statuses it applies to, resulting status)
+    TRANSITIONS = {
+        'pause': (['active'], 'paused'),
+        'resume': (['paused'], 'active'),
+    }
+
+    @staticmethod
+    def change_status(queryset, action):
+        """``UPDATE ... RETURNING id`` for ads in ``queryset`` that allow ``action``"""
+        from_statuses, to_status = AdLifecycleService.TRANSITIONS[action]
+        if queryset.query.is_empty():
+            # e.g. a `near` filter with no city in range; no SQL to embed
+            return []
+        subquery, params = (
+            queryset.filter(status__in=from_statuses).order_by().values('id').query.sql_with_params()
+        )
+        table = Ad._meta.db_table
+        with connections[queryset.db].cursor() as cursor:
+            # The outer status check is re-evaluated on rows changed concurrently
+            cursor.execute(
+                f"UPDATE {table} SET status = %s, updated_at = %s "
+                f"WHERE id IN ({subquery}) AND status = ANY(%s) RETURNING id",
+                [to_status, timezone.now(), *params, from_statuses]
+            )
+            ids = sorted(row[0] for row in cursor.fetchall())
+        logger.info(f"Bulk {action}: {len(ids)} ads set to {to_status}")
+        return ids
+
+    @staticmethod
+    def delete(queryset):
+        """Delete the ads in ``queryset`` (and their media rows); return their ids"""
+        with transaction.atomic():
+            ids = list(queryset.select_for_update().order_by('id').values_list('id', flat=True))
+            if ids:
+                Ad.objects.filter(id__in=ids).delete()
+        logger.info(f"Bulk delete: {len(ids)} ads deleted")
+        return ids
+
+    @staticmethod
+    def expire_overdue(batch_size=1000, max_batches=None, now=None):
+        """Move active ads past ``expires_at`` to ``expired``; return how many.
+
+        Works in chunks of ``batch_size``, each its own short transaction.
+        Rows locked by other writers are skipped (``SKIP LOCKED``) and picked
+        up by a later run, so the sweep never waits on live traffic.
+        """
+        now = now or timezone.now()
+        table = Ad._meta.db_table
+        expired = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f"WITH due AS ("
+                    f"  SELECT id FROM {table}"
+                    f"  WHERE status = 'active' AND expires_at <= %s"
+                    f"  ORDER BY expires_at LIMIT %s FOR UPDATE SKIP LOCKED"
+                    f") "
+                    f"UPDATE {table} SET status = 'expired', updated_at = %s "
+                    f"FROM due WHERE {table}.id = due.id",
+                    [now, batch_size, timezone.now()]
+                )
+                count = cursor.rowcount
+            expired += count
+            batches += 1
+            if count < batch_size:
+                break
+        logger.info(f"Expired {expired} overdue ads in {batches} batches")
+        return expired
+
+
+class PriceService:
+    """Keeps ``Ad.price_normalized`` in step with ``ExchangeRate``"""
+
+    @staticmethod
+    def renormalize(currency_codes=None, batch_size=None):
+        """Recompute ``price_normalized`` for ads priced in ``currency_codes``
+        (all currencies when None); return how many rows changed. Prices in
+        a currency without a rate become NULL.
+
+        Walks the table in id ranges of ``batch_size``, each its own short
+        transaction, and only writes rows whose value differs. The upper id
+        is re-read for every batch, so ads created with a stale rate while
+        it runs are covered too.
+        """
+        batch_size = batch_size or settings.ADS_PRICE_RENORMALIZE_BATCH_SIZE
+        table = Ad._meta.db_table
+        base = settings.ADS_BASE_CURRENCY
+        currency_filter = "AND s.currency_code = ANY(%s)" if currency_codes is not None else ""
+
+        updated = 0
+        start = Ad.objects.order_by('id').values_list('id', flat=True).first()
+        while start is not None:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f"WITH rates AS ("
+                    f"  SELECT currency_code, rate FROM {ExchangeRate._meta.db_table}"
+                    f"  WHERE currency_code <> %s"
+                    f"  UNION ALL SELECT %s, 1"
+                    f") "
+                    f"UPDATE {table} a SET price_normalized = n.value "
+                    f"FROM ("
+                    f"  SELECT s.id, ROUND(s.price * r.rate, {NORMALIZED_PLACES}) AS value"
+                    f"  FROM {table} s LEFT JOIN rates r ON r.currency_code = s.currency_code"
+                    f"  WHERE s.id >= %s AND s.id < %s {currency_filter}"
+                    f") n "
+                    f"WHERE a.id = n.id AND a.price_normalized IS DISTINCT FROM n.value",
+                    [base, base, start, start + batch_size]
+                    + ([list(currency_codes)] if currency_codes is not None else [])
+                )
+                updated += cursor.rowcount
+            start += batch_size
+            if not Ad.objects.filter(id__gte=start).exists():
+                break
+        logger.info(f"Renormalized {updated} ad prices for {currency_codes or 'all currencies'}")
+        return updated
+
+
+class ModerationService:
+    """Work queue over ``pending_approval`` ads.
+
+    Moderators claim the oldest unclaimed ads for a lease period. Claiming
+    uses ``FOR UPDATE SKIP LOCKED``, so concurrent moderators never block
+    each other or receive the same ad; a claim whose lease has run out
+    returns to the queue. Decisions apply only to ads the moderator still
+    holds a live claim on.
+    """
+
+    # decision -> resulting status
+    DECISIONS = {
+        'approve': 'active',
+        'reject': 'rejected',
+    }
+
+    @staticmethod
+    def claim(moderator, limit, lease_seconds=None):
+        """Claim up to ``limit`` ads; return ``(ids, lease_expires_at)``"""
+        lease_seconds = lease_seconds or settings.ADS_MODERATION_LEASE_SECONDS
+        now = timezone.now()
+        lease_expires_at = now + timezone.timedelta(seconds=lease_seconds)
+        table = Ad._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH next AS ("
+                f"  SELECT id FROM {table}"
+                f"  WHERE status = 'pending_approval'"
+                f"    AND (claim_expires_at IS NULL OR claim_expires_at < %s)"
+                f"  ORDER BY created_at, id LIMIT %s FOR UPDATE SKIP LOCKED"
+                f") "
+                f"UPDATE {table} SET claimed_by_id = %s, claim_expires_at = %s "
+                f"FROM next WHERE {table}.id = next.id RETURNING {table}.id",
+                [now, limit, moderator.id, lease_expires_at]
+            )
+            ids = sorted(row[0] for row in cursor.fetchall())
+        logger.info(f"Moderator {moderator.id} claimed {len(ids)} ads")
+        return ids, lease_expires_at
+
+    @staticmethod
+    def held_claims(moderator):
+        """Pending ads the moderator currently holds a live claim on"""
+        return Ad.objects.filter(
+            status='pending_approval',
+            claimed_by=moderator,
+            claim_expires_at__gte=timezone.now()
+        )
+
+    @staticmethod
+    def decide(moderator, ids, decision):
+        """Approve or reject claimed ads in one statement; return the ids changed"""
+        now = timezone.now()
+        fields = {
+            'status': ModerationService.DECISIONS[decision],
+            'claimed_by_id': None,
+            'claim_expires_at': None,
+            'updated_at': now,
+        }
+        if decision == 'approve':
+            # The listing period starts when the ad goes live
+            fields['expires_at'] = now + Ad.LISTING_DURATION
+        return ModerationService._update_claims(moderator, ids, fields, decision)
+
+    @staticmethod
+    def release(moderator, ids):
+        """Return claimed ads to the queue without a decision"""
+        fields = {'claimed_by_id': None, 'claim_expires_at': None}
+        return ModerationService._update_claims(moderator, ids, fields, 'release')
+
+    @staticmethod
+    def _update_claims(moderator, ids, fields, action):
+        table = Ad._meta.db_table
+        assignments = ', '.join(f"{column} = %s" for column in fields)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET {assignments} "
+                f"WHERE id = ANY(%s) AND status = 'pending_approval' "
+                f"  AND claimed_by_id = %s AND claim_expires_at >= %s "
+                f"RETURNING id",
+                [*fields.values(), list(ids), moderator.id, timezone.now()]
+            )
+            changed = sorted(row[0] for row in cursor.fetchall())
+        logger.info(f"Moderator {moderator.id} {action}: {len(changed)} ads")
+        return changed
+
+    @staticmethod
+    def queue_stats():
+        now = timezone.now()
+        pending = Ad.objects.filter(status='pending_approval')
+        claimed = pending.filter(claim_expires_at__gte=now)
+        oldest = pending.order_by('created_at', 'id').values_list('created_at', flat=True).first()
+        return {
+            'pending': pending.count(),
+            'claimed': claimed.count(),
+            'oldest_pending_at': oldest,
+        }
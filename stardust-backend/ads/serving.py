@@ -0,0 +1,112 @@
+"""Serving stored ad media through the front proxy.
+
+Every media URL is immutable: blobs are named by the SHA-256 of their
+content, variants by a hash of theirs, and per-ad originals by a UUID that
+is never reused. ``serve_media`` only checks that a URL names a file an
+ad the requester may see references: any active ad, or else one they own
+(moderators see all). It answers with far-future caching headers plus
+``X-Accel-Redirect`` (nginx) or ``X-Sendfile`` (Apache, lighttpd); the
+proxy then sends the bytes, so no Python worker ever streams a file.
+Media of ads that are not active is marked ``private`` so shared caches
+never keep it.
+
+In development ``config.middleware.AccelRedirectMiddleware`` stands in for
+the proxy. Example nginx configuration::
+
+    location /protected-media/ {
+        internal;
+        alias /srv/stardust/media/;
+    }
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .media import BLOB_DIR, MEDIA_ROOT_DIR
+from .models import Ad, AdMedia
+from .permissions import is_moderator
+
+
+BLOB_PATH = re.compile(
+    rf'^{BLOB_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/(?P<sha256>[0-9a-f]{{64}})\.[a-z0-9]+$'
+)
+VARIANT_PATH = re.compile(
+    rf'^{MEDIA_ROOT_DIR}/(?P<ad_id>\d+)/variants/(?P<media_id>\d+)-\w+-[0-9a-f]{{16}}\.[a-z0-9]+$'
+)
+# Per-ad originals stored before content-addressed storage (ads.media.media_path)
+ORIGINAL_PATH = re.compile(
+    rf'^{MEDIA_ROOT_DIR}/(?P<ad_id>\d+)/[0-9a-f]{{8}}-[0-9a-f]{{4}}-[0-9a-f]{{4}}-[0-9a-f]{{4}}-[0-9a-f]{{12}}\.[a-z0-9]+$'
+)
+
+
+def referencing_ads(path):
+    """Ads whose media refer to ``path``, or ``None`` for a malformed path.
+
+    Each form is checked with one indexed lookup. Files whose ad was
+    deleted but which are not yet collected are referenced by no ad.
+    """
+    match = BLOB_PATH.match(path)
+    if match:
+        return Ad.objects.filter(media__blob__sha256=match['sha256'], media__blob__path=path)
+
+    match = VARIANT_PATH.match(path)
+    if match:
+        variants = AdMedia.objects.filter(
+            id=match['media_id'], ad_id=match['ad_id']
+        ).values_list('variants', flat=True).first()
+        if variants and any(variant['path'] == path for variant in variants.values()):
+            return Ad.objects.filter(pk=match['ad_id'])
+        return Ad.objects.none()
+
+    match = ORIGINAL_PATH.match(path)
+    if match:
+        return Ad.objects.filter(pk=match['ad_id'], media__file_path=path)
+
+    return None
+
+
+def get_user(request):
+    """The session user, or the user of a valid JWT in the request"""
+    if request.user.is_authenticated:
+        return request.user
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return authenticated[0] if authenticated else None
+
+
+def accel_response(path, public=True):
+    """Empty response telling the front proxy to send ``path`` from MEDIA_ROOT"""
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    response = HttpResponse(content_type=content_type)
+    if settings.ADS_MEDIA_ACCEL_MODE == 'sendfile':
+        response['X-Sendfile'] = os.path.join(settings.MEDIA_ROOT, path)
+    else:
+        response['X-Accel-Redirect'] = settings.ADS_MEDIA_ACCEL_PREFIX + quote(path)
+    # Content never changes under a given URL
+    response['Cache-Control'] = (
+        f"{'public' if public else 'private'}, max-age={settings.ADS_MEDIA_CACHE_MAX_AGE}, immutable"
+    )
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    ads = referencing_ads(path)
+    if ads is None:
+        raise Http404("Media not found")
+    if ads.filter(status='active').exists():
+        return accel_response(path)
+    # Not found rather than forbidden: unpublished media stays unlisted
+    user = get_user(request)
+    if user is None or not (is_moderator(user) or ads.filter(author=user).exists()):
+        raise Http404("Media not found")
+    return accel_response(path, public=False)
@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .currency import schedule_renormalization
+from .models import Ad, Category, SubCategory, Country, Province, City, ExchangeRate
+from .registry import bump_reference_version
+
+
+REFERENCE_MODELS = (Category, SubCategory, Country, Province, City, ExchangeRate)
+
+
+def reference_data_changed(sender, **kwargs):
+    """Invalidate precomputed taxonomy/geography payloads and the reference
+    registry once the change commits"""
+    transaction.on_commit(bump_reference_version)
+
+
+# Connected per model: a post_delete receiver without a sender would stop
+# Django from fast-deleting every other model (e.g. Ad -> AdMedia cascades)
+for model in REFERENCE_MODELS:
+    post_save.connect(reference_data_changed, sender=model)
+    post_delete.connect(reference_data_changed, sender=model)
+
+
+@receiver(post_save, sender=SubCategory)
+def subcategory_moved(sender, instance, created, **kwargs):
+    """Keep the denormalized Ad.category in step when a subcategory changes category"""
+    if not created:
+        Ad.objects.filter(subcategory=instance).exclude(category_id=instance.category_id).update(
+            category_id=instance.category_id
+        )
+
+
+@receiver(post_save, sender=Province)
+def province_moved(sender, instance, created, **kwargs):
+    if not created:
+        Ad.objects.filter(province=instance).exclude(country_id=instance.country_id).update(
+            country_id=instance.country_id
+        )
+
+
+@receiver(post_save, sender=City)
+def city_moved(sender, instance, created, **kwargs):
+    if not created:
+        country_id = Province.objects.values_list('country_id', flat=True).get(id=instance.province_id)
+        Ad.objects.filter(city=instance).exclude(province_id=instance.province_id).update(
+            province_id=instance.province_id, country_id=country_id
+        )
+
+
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def exchange_rate_changed(sender, instance, **kwargs):
+    """Recompute Ad.price_normalized for the currency once the rate change commits"""
+    transaction.on_commit(lambda: schedule_renormalization([instance.currency_code]))
@@ -0,0 +1,206 @@
+"""Typeahead suggestions for the ad search box.
+
+A completion is an active ad title, lowercased, ranked by the number of
+active ads with that title. The ``ADS_SUGGEST_POPULAR_SIZE`` most frequent
+titles are counted periodically by Celery beat (``refresh_suggestions``)
+into the shared cache, and every process keeps them in memory as
+``PopularCompletions``: the top completions of each short prefix are
+precomputed, and longer prefixes bisect the titles sorted alphabetically.
+Any title left out is rarer than every popular one, so when a prefix has
+at least ``limit`` popular matches they are the answer and no query runs.
+
+Otherwise, for prefixes of at least ``ADS_SUGGEST_MIN_QUERY_LENGTH``
+characters, the matching titles are counted with ``lower(title) LIKE
+'prefix%'`` through the ``text_pattern_ops`` index on active ad titles,
+merged with the popular matches, and the result is cached per prefix.
+Matching is by prefix only: there is no substring or typo-tolerant
+matching, so no ``pg_trgm`` index is needed; a plain btree serves it.
+Processes compare their snapshot's version with the shared one at most
+every ``ADS_SUGGEST_CHECK_INTERVAL`` seconds, like ``ads.registry``.
+"""
+import hashlib
+import heapq
+import logging
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .models import Ad
+
+logger = logging.getLogger(__name__)
+
+
+POPULAR_KEY = 'ads:suggest:popular'
+POPULAR_VERSION_KEY = 'ads:suggest:popular:version'
+# Held while a process counts the popular completions outside Celery beat;
+# expires rather than being released, so a failing count is not retried
+# more often than this
+POPULAR_LOCK_KEY = 'ads:suggest:popular:lock'
+POPULAR_LOCK_TIMEOUT = 300
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_prefix(text):
+    """Lowercased ``text`` with runs of whitespace collapsed, as completions are"""
+    return WHITESPACE.sub(' ', text.lower()).lstrip()[:Ad._meta.get_field('title').max_length]
+
+
+def like_prefix(prefix):
+    """``LIKE`` pattern matching values that start with ``prefix``"""
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"{escaped}%"
+
+
+class PopularCompletions:
+    """The most frequent active ad titles, by prefix"""
+
+    def __init__(self, version, rows):
+        # rows: (completion, ads) ordered by ads, most frequent first
+        self.version = version
+        self.rows = rows
+        self.by_prefix = {}
+        for completion, ads in rows:
+            for length in range(1, min(len(completion), settings.ADS_SUGGEST_PREFIX_LENGTH) + 1):
+                top = self.by_prefix.setdefault(completion[:length], [])
+                if len(top) < settings.ADS_SUGGEST_MAX_LIMIT:
+                    top.append((completion, ads))
+        # (completion, rank) sorted alphabetically, for longer prefixes
+        self.ordered = sorted((completion, rank) for rank, (completion, _) in enumerate(rows))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def complete(self, prefix, limit):
+        """Up to ``limit`` ``(completion, ads)`` starting with ``prefix``, most frequent first"""
+        if len(prefix) <= settings.ADS_SUGGEST_PREFIX_LENGTH:
+            return self.by_prefix.get(prefix, [])[:limit]
+        start = bisect_left(self.ordered, (prefix,))
+        ranks = []
+        for completion, rank in self.ordered[start:]:
+            if not completion.startswith(prefix):
+                break
+            ranks.append(rank)
+        return [self.rows[rank] for rank in heapq.nsmallest(limit, ranks)]
+
+
+def count_popular_completions():
+    """``[(completion, ads)]`` for the most frequent active ad titles"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT lower(title), COUNT(*) FROM {Ad._meta.db_table} "
+            f"WHERE status = 'active' "
+            f"GROUP BY 1 HAVING COUNT(*) >= %s ORDER BY 2 DESC, 1 LIMIT %s",
+            [settings.ADS_SUGGEST_MIN_ADS, settings.ADS_SUGGEST_POPULAR_SIZE]
+        )
+        return cursor.fetchall()
+
+
+def refresh_popular_completions():
+    """Recount the popular completions into the shared cache; return ``(version, rows)``"""
+    rows = count_popular_completions()
+    version = uuid.uuid4().hex
+    cache.set(POPULAR_KEY, (version, rows), None)
+    cache.set(POPULAR_VERSION_KEY, version, None)
+    logger.info(f"Refreshed {len(rows)} popular search completions")
+    return version, rows
+
+
+def refresh_in_background():
+    """Count the popular completions in a thread of this process, unless
+    another process or thread holds the lock"""
+    if not cache.add(POPULAR_LOCK_KEY, True, POPULAR_LOCK_TIMEOUT):
+        return
+
+    def refresh():
+        try:
+            refresh_popular_completions()
+        except Exception as e:
+            logger.error(f"Error counting popular search completions: {str(e)}")
+        finally:
+            connection.close()
+
+    threading.Thread(target=refresh, name='suggest-refresh', daemon=True).start()
+
+
+_popular = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_popular_completions():
+    """This process's snapshot, reloaded if the shared version has changed.
+
+    Until anything is counted (before the first beat run, or with a cache
+    local to each process) no completion is popular; meanwhile one thread
+    per cache counts them, so no request waits for the count.
+    """
+    global _popular, _checked_at
+    popular = _popular
+    now = time.monotonic()
+    if popular is not None and now - _checked_at < settings.ADS_SUGGEST_CHECK_INTERVAL:
+        return popular
+
+    version = cache.get(POPULAR_VERSION_KEY)
+    if version is None:
+        refresh_in_background()
+    if popular is None or (version is not None and popular.version != version):
+        with _lock:
+            if _popular is None or (version is not None and _popular.version != version):
+                snapshot = cache.get(POPULAR_KEY)
+                # Evicted from the shared cache: keep serving the snapshot
+                # held here until the next refresh
+                if snapshot is not None and (_popular is None or _popular.version != snapshot[0]):
+                    _popular = PopularCompletions(*snapshot)
+                elif _popular is None:
+                    _popular = PopularCompletions(None, [])
+            popular = _popular
+    _checked_at = now
+    return popular
+
+
+def query_completions(prefix):
+    """``[(completion, ads)]`` from the title prefix index, most frequent first.
+
+    Every matching title is counted before the top ones are taken, so the
+    ranking is exact; the index is ordered by title, so this reads only the
+    entries for ``prefix``.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT lower(title), COUNT(*) FROM {Ad._meta.db_table} "
+            f"WHERE status = 'active' AND lower(title) LIKE %s "
+            f"GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT %s",
+            [like_prefix(prefix), settings.ADS_SUGGEST_MAX_LIMIT]
+        )
+        return cursor.fetchall()
+
+
+def merge_completions(popular, queried, limit):
+    """The top ``limit`` of both lists; the in-memory counts win for titles
+    in both, as the queried ones may be cached from before the last recount"""
+    counts = dict(queried)
+    counts.update(popular)
+    return heapq.nsmallest(limit, counts.items(), key=lambda row: (-row[1], row[0]))
+
+
+def get_suggestions(text, limit):
+    """Up to ``limit`` completions of ``text`` as ``{text, count}``"""
+    prefix = normalize_prefix(text)
+    if not prefix:
+        return []
+    completions = get_popular_completions().complete(prefix, limit)
+    if len(completions) < limit and len(prefix) >= settings.ADS_SUGGEST_MIN_QUERY_LENGTH:
+        key = f"ads:suggest:{hashlib.md5(prefix.encode('utf-8')).hexdigest()}"
+        queried = cache.get(key)
+        if queried is None:
+            queried = query_completions(prefix)
+            cache.set(key, queried, settings.ADS_SUGGEST_CACHE_TIMEOUT)
+        completions = merge_completions(completions, queried, limit)
+    return [{'text': completion, 'count': ads} for completion, ads in completions]
@@ -0,0 +1,44 @@
+from celery import shared_task
+from django.conf import settings
+
+from .counters import flush_view_counts as flush_pending_view_counts
+from .images import process_media
+from .media import collect_blobs, reconcile_orphans
+from .services import AdLifecycleService, PriceService
+from .suggest import refresh_popular_completions
+
+
+@shared_task
+def flush_view_counts():
+    """Periodic flush of buffered ad views (see CELERY_BEAT_SCHEDULE)"""
+    return flush_pending_view_counts()
+
+
+@shared_task
+def expire_ads():
+    """Periodic expiry sweep (see CELERY_BEAT_SCHEDULE)"""
+    return AdLifecycleService.expire_overdue(batch_size=settings.ADS_EXPIRY_BATCH_SIZE)
+
+
+@shared_task
+def reconcile_media():
+    """Periodic removal of stored media no row refers to (see CELERY_BEAT_SCHEDULE)"""
+    return len(collect_blobs()) + len(reconcile_orphans())
+
+
+@shared_task(ignore_result=True)
+def generate_media_variants(media_id, force=False):
+    """Resize/re-encode one uploaded image; queued after upload_media commits"""
+    return process_media(media_id, force=force)
+
+
+@shared_task(ignore_result=True)
+def renormalize_prices(currency_codes=None):
+    """Recompute Ad.price_normalized; queued when an exchange rate changes"""
+    return PriceService.renormalize(currency_codes)
+
+
+@shared_task(ignore_result=True)
+def refresh_suggestions():
+    """Periodic recount of popular search completions (see CELERY_BEAT_SCHEDULE)"""
+    refresh_popular_completions()
@@ -1,7 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import CategoryViewSet, AdViewSet
-from .api_views import CategoriesView, CountriesView, LocationsView, AdViewSet as NewAdViewSet, UserAdsView
+from .api_views import (
+    CategoriesView, CountriesView, LocationsView, AdViewSet as NewAdViewSet, UserAdsView,
+    ModerationQueueView, ModerationClaimView, ModerationDecisionView
+)
 
 # Legacy router for existing views
 router = DefaultRouter()
@@ -23,6 +26,38 @@ api_patterns = [
         'post': 'create'
     }), name='ads_list_create'),
     
+    path('ads/batch/', NewAdViewSet.as_view({
+        'post': 'batch_create'
+    }), name='ads_batch_create'),
+    
+    path('ads/bulk/pause/', NewAdViewSet.as_view({
+        'post': 'bulk_pause'
+    }), name='ads_bulk_pause'),
+    
+    path('ads/bulk/resume/', NewAdViewSet.as_view({
+        'post': 'bulk_resume'
+    }), name='ads_bulk_resume'),
+    
+    path('ads/bulk/delete/', NewAdViewSet.as_view({
+        'post': 'bulk_delete'
+    }), name='ads_bulk_delete'),
+    
+    path('ads/facets/', NewAdViewSet.as_view({
+        'get': 'facets'
+    }), name='ads_facets'),
+    
+    path('ads/price-histogram/', NewAdViewSet.as_view({
+        'get': 'price_histogram'
+    }), name='ads_price_histogram'),
+    
+    path('ads/suggest/', NewAdViewSet.as_view({
+        'get': 'suggest'
+    }), name='ads_suggest'),
+    
+    path('ads/clusters/', NewAdViewSet.as_view({
+        'get': 'clusters'
+    }), name='ads_clusters'),
+    
     path('ads/<int:pk>/', NewAdViewSet.as_view({
         'get': 'retrieve',
         'patch': 'partial_update',
@@ -44,6 +79,13 @@ api_patterns = [
     
     # User ads
     path('user/ads/', UserAdsView.as_view(), name='user_ads'),
+    
+    # Moderation queue
+    path('moderation/queue/', ModerationQueueView.as_view(), name='moderation_queue'),
+    path('moderation/claim/', ModerationClaimView.as_view(), name='moderation_claim'),
+    path('moderation/approve/', ModerationDecisionView.as_view(decision='approve'), name='moderation_approve'),
+    path('moderation/reject/', ModerationDecisionView.as_view(decision='reject'), name='moderation_reject'),
+    path('moderation/release/', ModerationDecisionView.as_view(decision='release'), name='moderation_release'),
 ]
 
 urlpatterns = [
@@ -1,3 +1,10 @@
+import os
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponseNotFound
+
+
 class APIVersionMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -5,4 +12,37 @@ class APIVersionMiddleware:
     def __call__(self, request):
         if request.path.startswith('/api/'):
             request.version = 'v1'  # Extract from URL if multiple versions exist
-        return self.get_response(request)
\ No newline at end of file
+        return self.get_response(request)
+
+
+class AccelRedirectMiddleware:
+    """Development stand-in for the front proxy's internal media location.
+
+    Replaces responses carrying ``X-Accel-Redirect`` or ``X-Sendfile`` (see
+    ads.serving) with the file they name. In production the proxy does
+    this and the middleware is not installed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        prefix = settings.ADS_MEDIA_ACCEL_PREFIX
+        if response.get('X-Accel-Redirect', '').startswith(prefix):
+            file_path = os.path.join(settings.MEDIA_ROOT, unquote(response['X-Accel-Redirect'][len(prefix):]))
+        elif response.has_header('X-Sendfile'):
+            file_path = response['X-Sendfile']
+        else:
+            return response
+
+        media_root = os.path.realpath(settings.MEDIA_ROOT)
+        file_path = os.path.realpath(file_path)
+        if os.path.commonpath([media_root, file_path]) != media_root or not os.path.isfile(file_path):
+            return HttpResponseNotFound()
+
+        served = FileResponse(open(file_path, 'rb'), content_type=response['Content-Type'])
+        for header, value in response.items():
+            if header.lower() not in ('content-type', 'content-length', 'x-accel-redirect', 'x-sendfile'):
+                served[header] = value
+        return served
@@ -49,6 +49,24 @@ DATABASES = {
 }
 
 
+# Cache
+# Shared Redis cache in production; per-process memory cache when REDIS_URL is unset.
+REDIS_URL = env('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",  # Vite default port
     "http://localhost:3000",  # React default port
@@ -71,6 +89,7 @@ INSTALLED_APPS = [
     'django.contrib.sites',
     'django.contrib.humanize',
     'django.contrib.sitemaps',
+    'django.contrib.postgres',
     
     # Third party apps
     'rest_framework',
@@ -99,6 +118,11 @@ MIDDLEWARE = [
    # 'config.middleware.ErrorHandlingMiddleware',  # To be reviewed later
 ]
 
+# Serve media locally by acting on X-Accel-Redirect/X-Sendfile in place of
+# the front proxy (see ads.serving). Never enable behind nginx or Apache.
+if env.bool('ADS_MEDIA_SERVE_LOCALLY', default=DEBUG):
+    MIDDLEWARE.insert(0, 'config.middleware.AccelRedirectMiddleware')
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -145,6 +169,7 @@ REST_FRAMEWORK = {
         'authentication': '5/minute',
         'password_reset': '3/hour',
         'otp_verification': '10/hour',
+        'suggest': '600/minute',
     },
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 20,
@@ -242,13 +267,118 @@ TWILIO_PHONE_NUMBER = env('TWILIO_PHONE_NUMBER', default='')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
-# Maximum file size for uploads (5MB)
-FILE_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024
+# Uploads larger than this are spooled to a temporary file instead of memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(2.5 * 1024 * 1024)
+# Same as Django's defaults, plus a SHA-256 of each file computed while it
+# streams in (content-addressed ad media, see ads.media)
+FILE_UPLOAD_HANDLERS = [
+    'ads.media.HashingMemoryFileUploadHandler',
+    'ads.media.HashingTemporaryFileUploadHandler',
+]
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024
 
 # Allowed file extensions for ad media
 ALLOWED_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.webp']
 MAX_IMAGES_PER_AD = 10
+# Maximum size of a single ad image (5MB)
+MAX_IMAGE_SIZE = 5 * 1024 * 1024
+# Threads shared by all requests for writing ad media to storage
+ADS_MEDIA_UPLOAD_WORKERS = env.int('ADS_MEDIA_UPLOAD_WORKERS', default=4)
+# Derivatives generated for every uploaded image (see ads.images). Sizes are
+# bounding boxes; images are only scaled down.
+ADS_MEDIA_VARIANTS = {
+    'thumb': {'size': (320, 320), 'format': 'JPEG', 'quality': 80},
+    'thumb_webp': {'size': (320, 320), 'format': 'WEBP', 'quality': 75},
+    'medium_webp': {'size': (800, 800), 'format': 'WEBP', 'quality': 80},
+    'large_webp': {'size': (1600, 1600), 'format': 'WEBP', 'quality': 82},
+}
+# Variant that replaces the original as Ad.thumbnail in listings
+ADS_MEDIA_THUMBNAIL_VARIANT = 'thumb'
+# Media responses hand the file to the front proxy (ads.serving): 'nginx'
+# sends X-Accel-Redirect to the internal location below, 'sendfile' sends
+# X-Sendfile with the file's absolute path
+ADS_MEDIA_ACCEL_MODE = env('ADS_MEDIA_ACCEL_MODE', default='nginx')
+ADS_MEDIA_ACCEL_PREFIX = env('ADS_MEDIA_ACCEL_PREFIX', default='/protected-media/')
+# Media URLs are content-addressed, so responses are cacheable for a year
+ADS_MEDIA_CACHE_MAX_AGE = env.int('ADS_MEDIA_CACHE_MAX_AGE', default=365 * 24 * 3600)
+# Stored media younger than this, or blobs used more recently, are never
+# treated as orphaned (upload in flight)
+ADS_MEDIA_ORPHAN_MIN_AGE = env.int('ADS_MEDIA_ORPHAN_MIN_AGE', default=3600)
+
+# Precomputed taxonomy/geography payloads (see ads.reference_data)
+ADS_REFERENCE_MAX_AGE = env.int('ADS_REFERENCE_MAX_AGE', default=24 * 3600)
+ADS_REFERENCE_CACHE_TIMEOUT = 7 * 24 * 3600
+# How often each process checks the reference version for its in-memory
+# registry (see ads.registry); bounds how long a rename takes to show up
+ADS_REFERENCE_REGISTRY_CHECK_INTERVAL = env.float('ADS_REFERENCE_REGISTRY_CHECK_INTERVAL', default=5)
+
+# Full-text search (see ads.search): searches matching more active ads than
+# this are listed newest first instead of by relevance, since ranking reads
+# every match's search vector
+ADS_SEARCH_RANK_LIMIT = env.int('ADS_SEARCH_RANK_LIMIT', default=10000)
+
+# Proximity search (?near=lat,lon&radius_km=, see ads.geo): radius used when
+# none is given, and the largest accepted
+ADS_NEAR_DEFAULT_RADIUS_KM = env.float('ADS_NEAR_DEFAULT_RADIUS_KM', default=25)
+ADS_NEAR_MAX_RADIUS_KM = env.float('ADS_NEAR_MAX_RADIUS_KM', default=200)
+
+# Totals in paginated ad listings (see ads.pagination.CustomPagination)
+# STRATEGY: 'exact' always runs COUNT(*); 'capped' reports THRESHOLD as a
+# lower bound ("10000+") once exceeded; 'estimate' uses the planner's row
+# estimate above THRESHOLD. Counts above THRESHOLD are cached per query.
+ADS_PAGINATION_COUNT = {
+    'STRATEGY': env('ADS_PAGINATION_COUNT_STRATEGY', default='capped'),
+    'THRESHOLD': env.int('ADS_PAGINATION_COUNT_THRESHOLD', default=10000),
+    'CACHE_TIMEOUT': env.int('ADS_PAGINATION_COUNT_CACHE_TIMEOUT', default=300),
+}
+
+# Batch ad creation (POST /api/v1/ads/ads/batch/)
+ADS_BATCH_CREATE_MAX_SIZE = env.int('ADS_BATCH_CREATE_MAX_SIZE', default=500)
+ADS_BATCH_CREATE_INSERT_SIZE = 500
+
+# Bulk pause/resume/delete (POST /api/v1/ads/ads/bulk/<action>/)
+ADS_BULK_ACTION_MAX_IDS = env.int('ADS_BULK_ACTION_MAX_IDS', default=1000)
+
+# Moderation queue: how many ads a moderator claims at once and for how long
+ADS_MODERATION_DEFAULT_CLAIM = 10
+ADS_MODERATION_MAX_CLAIM = 50
+ADS_MODERATION_LEASE_SECONDS = env.int('ADS_MODERATION_LEASE_SECONDS', default=600)
+
+# Cross-currency prices: Ad.price_normalized is in this currency (rates in
+# ads.ExchangeRate) and is recomputed in id ranges of this size
+ADS_BASE_CURRENCY = env('ADS_BASE_CURRENCY', default='USD')
+ADS_PRICE_RENORMALIZE_BATCH_SIZE = env.int('ADS_PRICE_RENORMALIZE_BATCH_SIZE', default=50000)
+
+# Facet counts for the ad search page, cached per normalized filter
+ADS_FACETS_CACHE_TIMEOUT = env.int('ADS_FACETS_CACHE_TIMEOUT', default=120)
+
+# Price slider histogram (see ads.histogram): default and largest bucket
+# count, cached per normalized filter
+ADS_PRICE_HISTOGRAM_BUCKETS = env.int('ADS_PRICE_HISTOGRAM_BUCKETS', default=20)
+ADS_PRICE_HISTOGRAM_MAX_BUCKETS = env.int('ADS_PRICE_HISTOGRAM_MAX_BUCKETS', default=100)
+ADS_PRICE_HISTOGRAM_CACHE_TIMEOUT = env.int('ADS_PRICE_HISTOGRAM_CACHE_TIMEOUT', default=120)
+
+# Typeahead suggestions (see ads.suggest): how many of the most frequent
+# active ad titles (with at least MIN_ADS ads) every process keeps in memory,
+# prefixes up to PREFIX_LENGTH characters with precomputed top completions,
+# and how often processes check for a newer count. Prefixes of at least
+# MIN_QUERY_LENGTH characters with too few popular matches count their titles
+# through the title prefix index; those results are cached
+ADS_SUGGEST_POPULAR_SIZE = env.int('ADS_SUGGEST_POPULAR_SIZE', default=10000)
+ADS_SUGGEST_MIN_ADS = env.int('ADS_SUGGEST_MIN_ADS', default=2)
+ADS_SUGGEST_PREFIX_LENGTH = 3
+ADS_SUGGEST_CHECK_INTERVAL = env.float('ADS_SUGGEST_CHECK_INTERVAL', default=5)
+ADS_SUGGEST_DEFAULT_LIMIT = 8
+ADS_SUGGEST_MAX_LIMIT = 20
+ADS_SUGGEST_MIN_QUERY_LENGTH = 3
+ADS_SUGGEST_CACHE_TIMEOUT = env.int('ADS_SUGGEST_CACHE_TIMEOUT', default=300)
+
+# Map clusters (see ads.clusters): grid cells per tile side, the deepest
+# zoom, how many tiles one request may cover, and how long tiles are cached
+ADS_MAP_TILE_CELLS = env.int('ADS_MAP_TILE_CELLS', default=8)
+ADS_MAP_MAX_ZOOM = env.int('ADS_MAP_MAX_ZOOM', default=18)
+ADS_MAP_MAX_TILES = env.int('ADS_MAP_MAX_TILES', default=64)
+ADS_MAP_CLUSTERS_CACHE_TIMEOUT = env.int('ADS_MAP_CLUSTERS_CACHE_TIMEOUT', default=120)
 
 # Celery Configuration (for background tasks)
 CELERY_BROKER_URL = env('CELERY_BROKER_URL', default='redis://localhost:6379/0')
@@ -257,6 +387,34 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'flush-ad-view-counts': {
+        'task': 'ads.tasks.flush_view_counts',
+        'schedule': env.int('ADS_VIEW_COUNTER_FLUSH_INTERVAL', default=30),
+    },
+    'expire-overdue-ads': {
+        'task': 'ads.tasks.expire_ads',
+        'schedule': env.int('ADS_EXPIRY_SWEEP_INTERVAL', default=300),
+    },
+    'reconcile-ad-media': {
+        'task': 'ads.tasks.reconcile_media',
+        'schedule': env.int('ADS_MEDIA_RECONCILE_INTERVAL', default=6 * 3600),
+    },
+    'refresh-ad-suggestions': {
+        'task': 'ads.tasks.refresh_suggestions',
+        'schedule': env.int('ADS_SUGGEST_REFRESH_INTERVAL', default=900),
+    },
+}
+
+# Ads flipped to 'expired' per transaction by the expiry sweeper
+ADS_EXPIRY_BATCH_SIZE = env.int('ADS_EXPIRY_BATCH_SIZE', default=1000)
+
+# Buffered ad view counts (see ads.counters), in a Redis hash shared by the
+# web workers and the flush task: REDIS_URL, else the Celery broker's Redis.
+# ads.counters.LocalViewCounter keeps counts in process memory, for tests only.
+ADS_VIEW_COUNTER = {
+    'BACKEND': 'ads.counters.RedisViewCounter',
+}
 
 # Frontend URL for email links
 FRONTEND_URL = env('FRONTEND_URL', default='http://localhost:5173')
@@ -20,4 +20,10 @@ class PasswordResetRateThrottle(AnonRateThrottle):
 class OTPVerificationRateThrottle(AnonRateThrottle):
     """Rate limiting for OTP verification endpoints"""
     scope = 'otp_verification'
-    rate = '10/hour'
\ No newline at end of file
+    rate = '10/hour'
+
+
+class SuggestRateThrottle(UserRateThrottle):
+    """Rate limiting for search-as-you-type, which sends a request per keystroke"""
+    scope = 'suggest'
+    rate = '600/minute'
\ No newline at end of file
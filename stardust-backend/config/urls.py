@@ -15,7 +15,8 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.conf import settings
+from django.urls import path, re_path, include
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
@@ -35,6 +36,7 @@ schema_view = get_schema_view(
 
 
 from accounts.api_views import HealthCheckView
+from ads.serving import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -48,6 +50,9 @@ urlpatterns = [
     # Ads API
     path('api/v1/ads/', include('ads.urls')),
     
+    # Ad media, sent by the front proxy (X-Accel-Redirect / X-Sendfile)
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$', serve_media, name='ad_media'),
+    
     # Django Classified (legacy)
     path('', include('django_classified.urls', namespace='django_classified')),
     